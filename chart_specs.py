@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import altair as alt
+
+# Streamlit runs the app as a fresh module on every rerun, so the state shared
+# by all sessions of the server process lives here, imported once.
+
+# the frames a chart references, by thread, while compile_chart runs
+_compiling = threading.local()
+# Altair's data transformer and theme are process-wide: every compile, and
+# every chart drawn while one may switch them, holds this lock
+chart_lock = threading.Lock()
+# shapes of the specs that passed schema validation in this process
+_validated = set()
+
+
+def named_dataset(data):
+    """Altair data transformer that leaves the frame out of the spec as a
+    named dataset, the way st.altair_chart does."""
+    _compiling.datasets[str(id(data))] = data
+    return {'name': str(id(data))}
+
+
+alt.data_transformers.register('named_dataset', named_dataset)
+
+
+def spec_shape(spec):
+    """JSON of ``spec`` without its datasets and with dataset names numbered
+    in order of use, alike for every compile of the same chart structure."""
+    names = {}
+
+    def strip(node):
+        if isinstance(node, dict):
+            return {key: ({'name': names.setdefault(value['name'], len(names))}
+                          if key == 'data' and isinstance(value, dict) and 'name' in value
+                          else strip(value))
+                    for key, value in node.items() if key != 'datasets'}
+        if isinstance(node, list):
+            return [strip(value) for value in node]
+        return node
+
+    return json.dumps(strip(spec), sort_keys=True, default=str)
+
+
+def compile_chart(chart):
+    """Vega-Lite spec of ``chart`` with its frames under ``datasets``.
+
+    The JSON schema validation runs once per spec shape in a server process;
+    reruns mostly change the data, not the structure.
+    """
+    _compiling.datasets = {}
+    spec = chart.to_dict(validate=False)
+    shape = spec_shape(spec)
+    if shape not in _validated:
+        chart.validate(spec)
+        _validated.add(shape)
+    spec.setdefault('datasets', {}).update(_compiling.datasets)
+    return spec
+
+
+def compile_charts(charts):
+    """Compile the ``charts`` (name -> chart) concurrently in a thread pool."""
+    if not charts:
+        return {}
+    with chart_lock, \
+            alt.themes.enable('none') if alt.themes.active == 'default' else nullcontext(), \
+            alt.data_transformers.enable('named_dataset'), \
+            ThreadPoolExecutor(max_workers=min(len(charts), os.cpu_count() or 1)) as pool:
+        return dict(zip(charts, pool.map(compile_chart, charts.values())))
@@ -0,0 +1,104 @@
+import numpy as np
+
+from parallel import process_map
+
+# the well life the EUR is taken to be produced over, in days
+eur_life_days = 30 * 365
+# bounds of the hyperbolic exponent and of the initial decline (1/day)
+b_bounds = (0.05, 1.95)
+di_bounds = (1e-5, 2.0)
+fit_chunk_wells = 2000
+fit_iterations = 8
+# fewer wells than this are fitted in this process
+parallel_min_wells = 10000
+
+
+def arps_cumulative(t, qi, di, b):
+    """Hyperbolic Arps cumulative production at time ``t`` (days), broadcasting.
+
+    ``qi`` is the initial rate per day, ``di`` the initial nominal decline per
+    day and ``b`` the hyperbolic exponent; b close to 1 uses the harmonic form.
+    """
+    t, qi, di, b = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (t, qi, di, b)))
+    harmonic = np.abs(1 - b) < 1e-6
+    b_safe = np.where(harmonic, 0.5, b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hyperbolic = qi / ((1 - b_safe) * di) * (1 - (1 + b_safe * di * t) ** (1 - 1 / b_safe))
+        return np.where(harmonic, qi / di * np.log1p(di * t), hyperbolic)
+
+
+def _profiled_residuals(log_cum, t, b, log_di):
+    """Log-space residuals with log qi solved in closed form as their mean.
+
+    All arguments broadcast against each other, with the points on the last axis.
+    """
+    residual = log_cum - np.log(arps_cumulative(t, 1.0, np.exp(log_di), b))
+    log_qi = residual.mean(axis=-1, keepdims=True)
+    return residual - log_qi, log_qi[..., 0]
+
+
+def _fit_chunk(args):
+    """Fit qi, di and b for one chunk of wells; a grid search then damped Gauss-Newton."""
+    t, cum = args
+    log_cum = np.log(cum)
+    wells = len(cum)
+
+    # coarse grid over (b, log di) for every well at once
+    b_grid = np.linspace(*b_bounds, 24)[None, :, None, None]
+    log_di_grid = np.linspace(*np.log(di_bounds), 48)[None, None, :, None]
+    residual, _ = _profiled_residuals(log_cum[:, None, None, :], t[:, None, None, :], b_grid, log_di_grid)
+    sse = np.nansum(residual ** 2, axis=-1).reshape(wells, -1)
+    best = np.nanargmin(np.where(np.isfinite(sse), sse, np.inf), axis=1)
+    b = b_grid.ravel()[best // log_di_grid.size]
+    log_di = log_di_grid.ravel()[best % log_di_grid.size]
+
+    def evaluate(b, log_di):
+        residual, log_qi = _profiled_residuals(log_cum, t, b[:, None], log_di[:, None])
+        return residual, log_qi, (residual ** 2).sum(axis=1)
+
+    residual, log_qi, sse = evaluate(b, log_di)
+    damping = np.full(wells, 1e-2)
+    step = 1e-4
+    for _ in range(fit_iterations):
+        # finite-difference Jacobian of the residuals in (b, log di), solved as
+        # a batch of 2x2 damped normal equations
+        jac_b = (evaluate(b + step, log_di)[0] - residual) / step
+        jac_d = (evaluate(b, log_di + step)[0] - residual) / step
+        jtj_bb = (jac_b ** 2).sum(axis=1) + damping
+        jtj_dd = (jac_d ** 2).sum(axis=1) + damping
+        jtj_bd = (jac_b * jac_d).sum(axis=1)
+        g_b, g_d = (jac_b * residual).sum(axis=1), (jac_d * residual).sum(axis=1)
+        det = jtj_bb * jtj_dd - jtj_bd ** 2
+        new_b = np.clip(b - (jtj_dd * g_b - jtj_bd * g_d) / det, *b_bounds)
+        new_log_di = np.clip(log_di - (jtj_bb * g_d - jtj_bd * g_b) / det, *np.log(di_bounds))
+
+        new_residual, new_log_qi, new_sse = evaluate(new_b, new_log_di)
+        better = np.isfinite(new_sse) & (new_sse < sse)
+        b, log_di = np.where(better, new_b, b), np.where(better, new_log_di, log_di)
+        residual = np.where(better[:, None], new_residual, residual)
+        log_qi, sse = np.where(better, new_log_qi, log_qi), np.where(better, new_sse, sse)
+        damping = np.where(better, damping / 10, damping * 10)
+
+    return np.column_stack([np.exp(log_qi), np.exp(log_di), b,
+                            np.sqrt(sse / cum.shape[1])])
+
+
+def fit_arps(t, cum, workers=None):
+    """Fit hyperbolic Arps parameters to cumulative production of many wells.
+
+    ``t`` and ``cum`` are (wells, points) arrays of days on production and
+    cumulative volume. Returns a (wells, 4) array of qi (per day), di (per day),
+    b and the log-space RMS error; wells with a missing or non-positive point
+    get NaN. Wells are fitted in vectorized chunks, spread over a process pool
+    when there are many of them.
+    """
+    t, cum = np.asarray(t, dtype=float), np.asarray(cum, dtype=float)
+    params = np.full((len(cum), 4), np.nan)
+    valid = np.flatnonzero(np.all(np.isfinite(cum) & (cum > 0) & (t > 0), axis=1))
+    if not len(valid):
+        return params
+
+    chunks = [(t[rows], cum[rows]) for rows in np.array_split(valid, -(-len(valid) // fit_chunk_wells))]
+    fitted = process_map(_fit_chunk, chunks, len(valid), parallel_min_wells, workers)
+    params[valid] = np.concatenate(fitted)
+    return params
@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_map(func, chunks, items, min_items, workers=None, initializer=None, initargs=()):
+    """``func`` of every chunk, in order, over a process pool when there are
+    at least ``min_items`` items; below that the pool costs more than it saves
+    and the chunks run in this process.
+
+    ``initializer(*initargs)`` sets up the per-process state ``func`` reads,
+    once in each worker, or here when running serially.
+    """
+    workers = workers or os.cpu_count() or 1
+    if items < min_items or workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(chunk) for chunk in chunks]
+    # spawned, not forked: the server process is multithreaded
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=initializer,
+                             initargs=initargs) as pool:
+        return list(pool.map(func, chunks))
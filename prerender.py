@@ -0,0 +1,64 @@
+"""Pre-render the app's charts for every filter preset.
+
+Run once after the dataset changes, from the repository root:
+
+    python prerender.py                      # all presets
+    python prerender.py "Oil window"         # just some of them
+
+Each preset's Vega-Lite specs, data inlined, are written under
+``snapshots/<dataset version>/``; the app serves them in place of building
+the charts while its filters still match the preset.
+"""
+import argparse
+import json
+import os
+import runpy
+import sys
+import warnings
+from pathlib import Path
+
+import altair as alt
+
+app_path = Path(__file__).parent / 'sl.py'
+
+
+def inline_records(data):
+    """Altair data transformer inlining a DataFrame as JSON-safe records."""
+    return {'values': json.loads(data.to_json(orient='records', date_format='iso'))}
+
+
+def render_preset(preset):
+    """Run the app headless with ``preset`` selected; returns its globals."""
+    os.environ['EF_PRESET'] = preset
+    os.environ['EF_SNAPSHOTS'] = '0'
+    sys.path.insert(0, str(app_path.parent))
+    try:
+        return runpy.run_path(str(app_path), run_name='__main__')
+    finally:
+        sys.path.remove(str(app_path.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('presets', nargs='*', help='preset names, all of them by default')
+    args = parser.parse_args()
+
+    alt.data_transformers.register('inline_records', inline_records)
+    alt.data_transformers.enable('inline_records')
+    warnings.filterwarnings('ignore', message='.*missing ScriptRunContext.*')
+
+    # the preset list lives in the app, so it is only known after the first run
+    presets = args.presets or ['Whole play']
+    for preset in presets:
+        app = render_preset(preset)
+        if not args.presets and preset == 'Whole play':
+            presets.extend(name for name in app['filter_presets'] if name != preset)
+        charts = {name: chart.to_dict() for name, chart in app['tab_charts'].items()}
+        path = app['snapshot_file'](app['dataset_version'], preset)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'preset': preset, 'state': app['snapshot_state'], 'charts': charts}))
+        print(f"{preset}: {len(charts)} charts -> {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# one directory shared by every server process on the host
+cache_dir = Path(os.environ.get('EF_SHARED_CACHE_DIR', Path(__file__).parent / '.shared_cache'))
+# least recently used entries are evicted beyond this size
+max_bytes = int(float(os.environ.get('EF_SHARED_CACHE_MB', 512)) * 2 ** 20)
+# eviction goes this far below the bound, so it does not run on every store
+evict_to = 0.8
+# part of every key; bump it when the stored form of entries changes
+cache_schema = 1
+
+
+def cache_key(*parts):
+    """Stable hash of JSON-like ``parts``; tuples and lists hash alike and
+    dict keys are sorted, so equal filter states give equal keys."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load(key):
+    """The value stored under ``key``, or None. A hit refreshes the entry's age."""
+    path = cache_dir / f"{key}.pkl"
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        # missing, or evicted by another process meanwhile
+        return None
+    with f:
+        try:
+            value = pickle.load(f)
+        except Exception:
+            # truncated, or pickled by other pandas or numpy versions
+            path.unlink(missing_ok=True)
+            return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return value
+
+
+def store(key, value):
+    """Store ``value`` under ``key`` atomically, then evict down to the bound.
+
+    The entry is written to a temporary file and renamed into place, so a
+    reader in another process sees either no entry or a complete one.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    handle, temp = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, cache_dir / f"{key}.pkl")
+    except OSError:
+        Path(temp).unlink(missing_ok=True)
+        return
+    evict()
+
+
+def evict():
+    """Delete the least recently used entries once the cache exceeds ``max_bytes``."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.pkl'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        Path(path).unlink(missing_ok=True)
+        total -= size
+        if total <= max_bytes * evict_to:
+            break
+
+
+def rows_bitmap(rows):
+    """Sorted row positions packed as a bitmap, one bit per row."""
+    mask = np.zeros(rows.max() + 1 if len(rows) else 0, dtype=bool)
+    mask[rows] = True
+    return np.packbits(mask)
+
+
+def bitmap_rows(bitmap):
+    return np.flatnonzero(np.unpackbits(bitmap))
+
+
+def source_digest(directory):
+    """Hash of the source of every module in ``directory``; read again only
+    when a file's size or modification time changes."""
+    paths = sorted(Path(directory).glob('*.py'))
+    return _files_digest(tuple((str(path), path.stat().st_size, path.stat().st_mtime_ns) for path in paths))
+
+
+@functools.lru_cache(maxsize=16)
+def _files_digest(files):
+    digest = hashlib.sha1()
+    for path, _, _ in files:
+        digest.update(Path(path).name.encode())
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def shared(func=None, *, encode=None, decode=None):
+    """Back a function with the on-disk cache shared between processes.
+
+    Like st.cache_data, arguments whose name starts with an underscore are
+    left out of the key, so the dataset version and the filter state stand
+    for the frames passed in. The source of every module next to the
+    function's own, the app's local modules, is part of the key, so editing
+    the function, its helpers or their constants never serves stale entries.
+    ``encode`` and ``decode`` convert the value to and from its stored form.
+    Goes beneath st.cache_data, which keeps answering repeated calls within
+    a process.
+    """
+    if func is None:
+        return functools.partial(shared, encode=encode, decode=decode)
+
+    signature = inspect.signature(func)
+    source = source_digest(Path(inspect.getsourcefile(func)).resolve().parent)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = cache_key(cache_schema, func.__qualname__, source,
+                        {name: value for name, value in bound.arguments.items()
+                         if not name.startswith('_')})
+        value = load(key)
+        if value is None:
+            value = func(*args, **kwargs)
+            store(key, value if encode is None else encode(value))
+            return value
+        return value if decode is None else decode(value)
+
+    return wrapper
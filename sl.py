@@ -1,6 +1,22 @@
 import streamlit as st
 import altair as alt
 import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import threading
+import tempfile
+import time
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy.spatial import cKDTree, ConvexHull, QhullError
+from spatial import (project_miles, haversine_miles, basin_latitude, miles_per_degree,
+                     spacing_table, parent_reach_miles)
+from decline import arps_cumulative, fit_arps, eur_life_days
+from shared_cache import shared, rows_bitmap, bitmap_rows
+from chart_specs import chart_lock, compile_charts
 from vega_datasets import data
 from datetime import date
 import requests
@@ -36,23 +52,1071 @@ with row1_1:
         "It includes: a general Eagle Ford overview, a geological analysis, production trends, and completion "
         "analysis. Data is downsampled to 25% to ensure app responsiveness")
 
-df = pd.read_csv("https://raw.githubusercontent.com/MoFaye/Eagleford_app/main/EF_data.csv")
-#df = df.sample(frac=0.1, random_state=1)
-df["drilling_start_date"] = pd.to_datetime(df["drilling_start_date"]).dt.date
+DATA_URL = "https://raw.githubusercontent.com/MoFaye/Eagleford_app/main/EF_data.csv"
+
+
+def derive_columns(df):
+    """Parse the drilling date and add the derived columns, in place."""
+    df["drilling_start_date"] = pd.to_datetime(df["drilling_start_date"]).dt.date
+
+    # create normalized frac fluid, proppant wieght, and cost by lateral length
+    df["norm_fracture_fluid"] = df['fracture_fluid__ugl'] / df['lateral_length__ft']
+    df["norm_proppant"] = df['proppant__lbs'] / df['lateral_length__ft']
+    df["norm_total_cost"] = df['total_cost__ud'] / df['lateral_length__ft']
+
+    # create fluid type column
+    df['GOR'] = df['cum30_gas__mcf'] * 1000 / df['cum30_oil__bl']
+    df.loc[df['GOR'] > 200000, 'GOR'] = 200000
+    df["Fluid_type"] = "Black Oil"
+    df.loc[df['GOR'] > 2500, "Fluid_type"] = "Volatie Oil"
+    df.loc[df['GOR'] > 5000, "Fluid_type"] = "Gas Condensate"
+    df.loc[df['GOR'] > 100000, "Fluid_type"] = "Gas"
+    df.loc[df['GOR'].isnull(), "Fluid_type"] = "Null"
+    return df
+
+
+derived_columns = ['norm_fracture_fluid', 'norm_proppant', 'norm_total_cost', 'GOR', 'Fluid_type']
+
+# caches that read only these columns are keyed by their own version, so a
+# delta that leaves the columns alone keeps those caches warm
+version_groups = {'location': ['tophole_longitude__deg', 'tophole_latitude__deg'],
+                  'spacing': ['tophole_longitude__deg', 'tophole_latitude__deg', 'drilling_start_date'],
+                  'tvd': ['tophole_longitude__deg', 'tophole_latitude__deg', 'tvd__ft']}
+# caches keyed by a dataset or group version keep this many entries, so the
+# versions deltas leave behind do not pile up in a long-running server; those
+# also keyed by the sample size keep that many per version
+version_cache_entries = 4
+sample_cache_entries = 8 * version_cache_entries
+
+
+def row_hashes(df, columns=None):
+    return pd.util.hash_pandas_object(df if columns is None else df[columns], index=False).to_numpy()
+
+
+def digest(hashes):
+    return hashlib.sha1(hashes).hexdigest()
+
+
+def hashed_versions(hashes):
+    """Dataset fields for per-row content hashes: whole rows under None and
+    each version group under its name."""
+    return {'hashes': hashes,
+            'version': digest(hashes[None]),
+            'versions': {group: digest(hashes[group]) for group in version_groups}}
+
+
+def dataset_hashes(df):
+    hashes = {None: row_hashes(df)}
+    hashes.update({group: row_hashes(df, columns) for group, columns in version_groups.items()})
+    return hashed_versions(hashes)
+
+
+@st.cache_resource
+def load_wells(url=DATA_URL):
+    """Read the well table once per server and add the derived columns.
+
+    Returns the shared dataset: the frame, a version (a hash of its content)
+    that keys every cache computed from it, per column group versions, an
+    api_number to row position index and the state of the delta ingest.
+    """
+    df = derive_columns(pd.read_csv(url))
+    api_positions = pd.Series(np.arange(len(df)), index=df['api_number'])
+    return {'wells': df,
+            **dataset_hashes(df),
+            'api_positions': api_positions[~api_positions.index.duplicated(keep='last')],
+            'decline': None,
+            'applied': set(),
+            'rejected': {},
+            'lock': threading.Lock()}
+
+
+# -- incremental ingest ------
+# daily permit and completion deltas: CSV files with the columns of the well
+# table (any subset, api_number required), applied in file name order
+delta_dir = Path(__file__).parent / 'deltas'
+
+
+def apply_delta(dataset, delta):
+    """Upsert ``delta`` rows into the dataset by api_number. Missing values
+    leave the stored ones as they are; for a well listed more than once the
+    last value of each column wins.
+
+    Only the inserted and changed rows have their derived columns, content
+    hashes and decline fit computed; the versions of column groups they leave
+    untouched stay the same. Row positions of existing wells never move, new
+    wells are appended. Returns the number of wells inserted or changed.
+    """
+    wells, hashes = dataset['wells'], dataset['hashes']
+    delta = delta.groupby('api_number', sort=False).last().reset_index().set_index('api_number', drop=False)
+    columns = [c for c in delta.columns if c in wells.columns and c not in derived_columns]
+    positions = dataset['api_positions'].reindex(delta.index)
+    existing = positions.notna().to_numpy()
+
+    updated = wells.iloc[positions[existing].astype(int)].copy()
+    updated[columns] = delta.loc[existing, columns].set_axis(updated.index).combine_first(updated[columns])
+    inserted = delta.loc[~existing, columns].reindex(columns=wells.columns)
+    first_label = wells.index.max() + 1 if len(wells) else 0
+    inserted.index = pd.RangeIndex(first_label, first_label + len(inserted))
+    changed = derive_columns(pd.concat([updated, inserted]).astype(wells.dtypes.to_dict(), errors='ignore'))
+
+    # drop updates that leave the row as it was
+    changed_hashes = row_hashes(changed)
+    update_positions = wells.index.get_indexer(updated.index)
+    differs = np.concatenate([changed_hashes[:len(updated)] != hashes[None][update_positions],
+                              np.ones(len(inserted), dtype=bool)])
+    if not differs.any():
+        return 0
+    changed, changed_hashes = changed[differs], changed_hashes[differs]
+    update_positions = update_positions[differs[:len(updated)]]
+    updated_rows = changed.iloc[:len(update_positions)]
+    inserted = changed.iloc[len(update_positions):]
+
+    merged = wells.copy()
+    merged.loc[updated_rows.index, merged.columns] = updated_rows
+    merged = pd.concat([merged, inserted])
+    if not merged.dtypes.equals(wells.dtypes):
+        # a column changed type, so earlier row hashes are no longer comparable
+        dataset.update(dataset_hashes(merged))
+    else:
+        rows = np.concatenate([update_positions, np.arange(len(wells), len(merged))])
+        new_hashes = {}
+        for group, row_hash in hashes.items():
+            row_hash = np.append(row_hash, np.zeros(len(inserted), dtype=row_hash.dtype))
+            row_hash[rows] = (changed_hashes if group is None
+                              else row_hashes(changed, version_groups[group]))
+            new_hashes[group] = row_hash
+        dataset.update(hashed_versions(new_hashes))
+
+    dataset['api_positions'] = pd.concat([
+        dataset['api_positions'],
+        pd.Series(np.arange(len(wells), len(merged)), index=inserted['api_number'])])
+    if dataset['decline'] is not None:
+        dataset['decline'] = pd.concat([dataset['decline'].drop(updated_rows.index),
+                                        fit_decline(changed)]).reindex(merged.index)
+    dataset['wells'] = merged
+    return len(changed)
+
+
+def read_delta(path):
+    """Read and check one delta file; raises ValueError when it cannot be applied.
+
+    Rows without an api_number are dropped, and drilling dates that do not
+    parse are left missing, so they keep the stored value.
+    """
+    delta = pd.read_csv(path)
+    if 'api_number' not in delta.columns:
+        raise ValueError("no api_number column")
+    delta = delta[delta['api_number'].notna()]
+    if 'drilling_start_date' in delta.columns:
+        delta['drilling_start_date'] = pd.to_datetime(delta['drilling_start_date'], errors='coerce')
+    return delta
+
+
+def ingest_deltas(dataset):
+    """Apply the delta files not seen yet and return a consistent
+    (wells, version, versions) view of the dataset.
+
+    A file is identified by name, size and modification time, so a rewritten
+    file is applied again; upserts make that harmless. A file that fails to
+    read or apply is recorded as seen all the same, with its error under
+    ``dataset['rejected']``, so it is not retried on every rerun.
+    """
+    with dataset['lock']:
+        files = sorted(delta_dir.glob('*.csv')) if delta_dir.is_dir() else []
+        keys = [(path.name, path.stat().st_size, path.stat().st_mtime_ns) for path in files]
+        for path, key in zip(files, keys):
+            if key in dataset['applied']:
+                continue
+            try:
+                apply_delta(dataset, read_delta(path))
+                dataset['rejected'].pop(path.name, None)
+            except Exception as error:
+                dataset['rejected'][path.name] = f"{type(error).__name__}: {error}"
+            dataset['applied'].add(key)
+        return dataset['wells'], dataset['version'], dataset['versions']
+
+
+# -- well search ------
+search_columns = ['Name', 'operator_name']
+search_limit = 50
+
+
+@st.cache_resource(max_entries=version_cache_entries)
+def prefix_index(_wells, version):
+    """Upper-cased ``search_columns`` values in sorted order with their row
+    positions, so a prefix matches one contiguous slice."""
+    index = {}
+    for column in search_columns:
+        keys = _wells[column].fillna('').astype(str).str.upper().to_numpy(dtype=str)
+        order = np.argsort(keys, kind='stable')
+        index[column] = keys[order], order
+    return index
+
+
+def api_position(dataset, _wells, api):
+    """Row position of the well with API number ``api`` in ``_wells``, or None.
+
+    A hash lookup in the dataset's api_number index, whatever the table size.
+    """
+    try:
+        position = dataset['api_positions'].get(int(api))
+    except (ValueError, OverflowError):
+        return None
+    # the index may already hold wells a newer delta appended
+    return None if position is None or position >= len(_wells) else int(position)
+
+
+def search_wells(dataset, _wells, version, query):
+    """Row positions of the wells whose API number is ``query`` or whose name
+    or operator starts with it (case-insensitive), at most ``search_limit``."""
+    query = query.strip()
+    if not query:
+        return np.array([], dtype=int)
+    exact = api_position(dataset, _wells, query) if query.isdigit() else None
+    matches = [] if exact is None else [[exact]]
+    for keys, order in prefix_index(_wells, version).values():
+        start, stop = np.searchsorted(keys, [query.upper(), query.upper() + '\uffff'])
+        matches.append(order[start:min(stop, start + search_limit)])
+    return pd.unique(np.concatenate(matches).astype(int))[:search_limit]
+
+
+# attributes of the well detail panel, by section
+well_details = {
+    'Completion': {'drilling_start_date': 'Drilling start',
+                   'tvd__ft': 'TVD (ft)',
+                   'lateral_length__ft': 'Lateral length (ft)',
+                   'proppant__lbs': 'Proppant (lb)',
+                   'norm_proppant': 'Proppant wt. (lb/ft)',
+                   'fracture_fluid__ugl': 'Frac fluid (gal)',
+                   'norm_fracture_fluid': 'Frac fluid (gal/ft)',
+                   'total_cost__ud': 'Total cost ($)'},
+    'Production': {'Fluid_type': 'Fluid type',
+                   'cum30_oil__bl': 'Cum. 30 day oil (bbl)',
+                   'cum30_gas__mcf': 'Cum. 30 day gas (mcf)',
+                   'cum90_total__be': 'Cum. 90 day (BOE)',
+                   'GOR': 'GOR (scf/bbl)',
+                   'eur_oil__mbl': 'Oil EUR (MBL)',
+                   'eur_gas__bf3': 'Gas EUR (BSCF)',
+                   'eur_total__mbe': 'Total EUR (MBE)'},
+}
 
-# create normalized frac fluid, proppant wieght, and cost by lateral length
-df["norm_fracture_fluid"] = df['fracture_fluid__ugl'] / df['lateral_length__ft']
-df["norm_proppant"] = df['proppant__lbs'] / df['lateral_length__ft']
-df["norm_total_cost"] = df['total_cost__ud'] / df['lateral_length__ft']
 
-# create fluid type column
-df['GOR'] = df['cum30_gas__mcf'] * 1000 / df['cum30_oil__bl']
-df.loc[df['GOR'] > 200000, 'GOR'] = 200000
-df["Fluid_type"] = "Black Oil"
-df.loc[df['GOR'] > 2500, "Fluid_type"] = "Volatie Oil"
-df.loc[df['GOR'] > 5000, "Fluid_type"] = "Gas Condensate"
-df.loc[df['GOR'] > 100000, "Fluid_type"] = "Gas"
-df.loc[df['GOR'].isnull(), "Fluid_type"] = "Null"
+# the filtered column of each filter, by filters key
+range_filters = {'tvd': 'tvd__ft',
+                 'dates': 'drilling_start_date',
+                 'lateral': 'lateral_length__ft',
+                 'proppant': 'norm_proppant',
+                 'frac_fluid': 'norm_fracture_fluid'}
+category_filters = {'sub_plays': 'sub_play_name',
+                    'fluid_types': 'Fluid_type'}
+# the limits of the range sliders, which are also their default values
+range_bounds = {'tvd': (0, 20000),
+                'dates': (date(2009, 1, 1), date(2023, 1, 1)),
+                'lateral': (0, 18000),
+                'proppant': (0, 5000),
+                'frac_fluid': (0, 4000)}
+
+
+@st.cache_resource(max_entries=version_cache_entries)
+def filter_index(_wells, version):
+    """Column indexes of the filters: for each range column its known values
+    in sorted order with their row positions, and for each category column
+    the row positions of every value."""
+    ranges = {}
+    for key, column in range_filters.items():
+        values = (pd.to_datetime(_wells[column]) if key == 'dates' else _wells[column]).to_numpy()
+        known = np.flatnonzero(pd.notna(values))
+        order = known[np.argsort(values[known], kind='stable')]
+        ranges[key] = values[order], order
+    categories = {key: _wells.groupby(column).indices for key, column in category_filters.items()}
+    return ranges, categories
+
+
+@st.cache_data(max_entries=sample_cache_entries)
+def sample_mask(_wells, version, sample_size):
+    """The downsampled wells as a boolean mask over the table."""
+    mask = np.zeros(len(_wells), dtype=bool)
+    mask[_wells.index.get_indexer(_wells.sample(frac=sample_size, random_state=1).index)] = True
+    return mask
+
+
+def range_mask(_wells, version, bounds):
+    """Boolean mask of the wells inside every range of ``bounds`` (a filters
+    key to (low, high) dict), two binary searches per range. Bounds are
+    exclusive and missing values never match."""
+    ranges, _ = filter_index(_wells, version)
+    mask = np.ones(len(_wells), dtype=bool)
+    for key, (values, order) in ranges.items():
+        lo, hi = (np.datetime64(bound) for bound in bounds[key]) if key == 'dates' else bounds[key]
+        keep = np.zeros(len(_wells), dtype=bool)
+        keep[order[np.searchsorted(values, lo, side='right'):np.searchsorted(values, hi, side='left')]] = True
+        mask &= keep
+    return mask
+
+
+def matching_mask(_wells, version, filters):
+    """Boolean mask of the wells matching ``filters``, from the filter index
+    alone: every condition only marks the positions it keeps.
+    """
+    _, categories = filter_index(_wells, version)
+    mask = sample_mask(_wells, version, filters['sample_size'])
+    for key, positions in categories.items():
+        keep = np.zeros(len(_wells), dtype=bool)
+        for value in filters[key]:
+            keep[positions.get(value, [])] = True
+        mask &= keep
+    return mask & range_mask(_wells, version, filters)
+
+
+@st.cache_data
+@shared(encode=rows_bitmap, decode=bitmap_rows)
+def filter_rows(_wells, version, filters):
+    """Sorted row positions of the wells matching ``filters``, cached per
+    filter state and shared with the other server processes as a bitmap."""
+    return np.flatnonzero(matching_mask(_wells, version, filters))
+
+
+kpi_columns = ['total_cost__ud', 'cum90_total__be', 'lateral_length__ft', 'norm_fracture_fluid',
+               'norm_proppant', 'eur_total__mbe', 'GOR']
+
+
+@st.cache_data
+@shared
+def kpi_summary(_df, version, filters):
+    """Well count and column means behind the metric tiles."""
+    return {'wells': len(_df.index), **_df[kpi_columns].mean().to_dict()}
+
+
+# EUR histogram domains (clamped) and the map grid used by the production tab cube
+eur_domains = {'eur_total__mbe': (0, 3),
+               'eur_oil__mbl': (0, 1.5),
+               'eur_gas__bf3': (0, 5)}
+eur_bins = 100
+grid_cell = 0.05  # degrees
+
+
+def eur_bin_index(values, column):
+    """Clamped histogram bin (0 to eur_bins - 1) of each EUR value; NaN stays NaN."""
+    lo, hi = eur_domains[column]
+    return np.clip(np.floor((values - lo) / ((hi - lo) / eur_bins)), 0, eur_bins - 1)
+
+
+@st.cache_data
+@shared
+def eur_histograms(_df, version, filters):
+    """Per Fluid_type histograms of each EUR column, binned with NumPy.
+
+    Returns at most ``len(fluid types) x eur_bins`` rows per EUR column, so the
+    payload sent to the browser does not grow with the well count.
+    """
+    fluid_codes, fluids = pd.factorize(_df['Fluid_type'])
+
+    histograms = []
+    for column, (lo, hi) in eur_domains.items():
+        width = (hi - lo) / eur_bins
+        eur_bin = eur_bin_index(_df[column].to_numpy(dtype=float), column)
+        valid = ~np.isnan(eur_bin) & (fluid_codes >= 0)
+        counts = np.bincount(fluid_codes[valid] * eur_bins + eur_bin[valid].astype(int),
+                             minlength=len(fluids) * eur_bins)
+        occupied = np.flatnonzero(counts)
+        histograms.append(pd.DataFrame({
+            'Fluid_type': fluids[occupied // eur_bins],
+            'measure': column,
+            'bin_start': lo + (occupied % eur_bins) * width,
+            'bin_end': lo + (occupied % eur_bins + 1) * width,
+            'wells': counts[occupied]}))
+
+    return pd.concat(histograms, ignore_index=True)
+
+
+@st.cache_data
+@shared
+def build_data_cube(_df, version, filters):
+    """Count wells by geo-grid cell x Fluid_type x EUR bin, once per EUR column.
+
+    The production tab cross-filters over this long table instead of the raw
+    wells, so brushing cost scales with the number of occupied cells and bins.
+    Wells without an EUR value keep a null bin so the map and pie still count
+    them.
+    """
+    cell_lon = (np.floor(_df['tophole_longitude__deg'] / grid_cell) + 0.5) * grid_cell
+    cell_lat = (np.floor(_df['tophole_latitude__deg'] / grid_cell) + 0.5) * grid_cell
+
+    cubes = []
+    for column, (lo, hi) in eur_domains.items():
+        width = (hi - lo) / eur_bins
+        eur_bin = eur_bin_index(_df[column], column)
+        cube = pd.DataFrame({'cell_lon': cell_lon.round(4),
+                             'cell_lat': cell_lat.round(4),
+                             'Fluid_type': _df['Fluid_type'],
+                             'eur_bin': eur_bin}
+                            ).groupby(['cell_lon', 'cell_lat', 'Fluid_type', 'eur_bin'],
+                                      dropna=False
+                                      ).size().rename('wells').reset_index()
+        cube['measure'] = column
+        cube['bin_start'] = lo + cube['eur_bin'] * width
+        cube['bin_end'] = cube['bin_start'] + width
+        cubes.append(cube.drop(columns='eur_bin'))
+
+    return pd.concat(cubes, ignore_index=True)
+
+
+# map cell of the drilling time-lapse and the pause between its frames
+timelapse_cell = 0.1  # degrees
+timelapse_frame_seconds = 0.15
+
+
+@st.cache_data
+@shared
+def drilling_timelapse(_df, version, filters):
+    """New wells per drilling quarter and map cell, sorted by quarter.
+
+    Each quarter's rows are one frame holding only the cells that quarter
+    added wells to; the map at a quarter is the running sum of the frames up
+    to it, so playback only ever sends the next frame.
+    """
+    started = pd.to_datetime(_df['drilling_start_date'])
+    known = (started.dt.year >= 2009) & _df['tophole_longitude__deg'].notna() & _df['tophole_latitude__deg'].notna()
+    frames = pd.DataFrame({
+        'quarter': started[known].dt.to_period('Q').dt.start_time,
+        'cell_lon': ((np.floor(_df.loc[known, 'tophole_longitude__deg'] / timelapse_cell) + 0.5)
+                     * timelapse_cell).round(4),
+        'cell_lat': ((np.floor(_df.loc[known, 'tophole_latitude__deg'] / timelapse_cell) + 0.5)
+                     * timelapse_cell).round(4)})
+    return frames.groupby(['quarter', 'cell_lon', 'cell_lat']).size().rename('wells').reset_index()
+
+
+completion_columns = ['lateral_length__ft', 'norm_fracture_fluid', 'norm_proppant']
+completion_quantiles = {'q25': 0.25, 'q50': 0.5, 'q75': 0.75}
+
+sketch_alpha = 0.01  # relative error bound of the sketched quantiles
+sketch_partitions = ['sub_play_name', 'operator_name', 'year', 'Fluid_type']
+sketch_zero_bucket = np.iinfo(np.int32).min  # reads back as 0
+
+
+def completion_frame(_df):
+    """Completion columns without the frac fluid and proppant outliers, plus
+    the keys the operator stats and sketches are grouped by."""
+    trimmed = _df[completion_columns].where((_df['norm_fracture_fluid'] < 4000)
+                                            & (_df['norm_proppant'] < 5000))
+    for column in ['api_number', 'operator_name', 'sub_play_name', 'Fluid_type']:
+        trimmed[column] = _df[column]
+    trimmed['year'] = pd.to_datetime(_df['drilling_start_date']).dt.year
+    return trimmed
+
+
+def sketch_frame(_df, alpha=sketch_alpha):
+    """Mergeable log-bucket quantile sketches (DDSketch style) of the completion
+    columns, one per sub-play x operator x year x fluid type partition.
+
+    A positive value v is counted in bucket ceil(log(v) / log(gamma)) with
+    gamma = (1 + alpha) / (1 - alpha), so a quantile read back from any merge
+    of partitions is within ``alpha`` relative error. Merging is a sum of bucket
+    counts; no raw rows are sorted.
+    """
+    trimmed = completion_frame(_df)
+    partition = trimmed.groupby(sketch_partitions, dropna=False, sort=False).ngroup().to_numpy()
+    partitions = trimmed[sketch_partitions].assign(partition=partition
+                                                   ).drop_duplicates('partition'
+                                                                     ).set_index('partition').sort_index()
+    partitions['wells'] = np.bincount(partition, minlength=len(partitions))
+
+    log_gamma = np.log((1 + alpha) / (1 - alpha))
+    counts = {}
+    for column in completion_columns:
+        values = trimmed[column].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bucket = np.where(values[valid] > 0,
+                              np.ceil(np.log(values[valid]) / log_gamma),
+                              sketch_zero_bucket)
+        counts[column] = pd.DataFrame({'partition': partition[valid],
+                                       'bucket': bucket.astype(np.int64)}
+                                      ).value_counts().rename('count').reset_index()
+
+    return {'alpha': alpha, 'partitions': partitions, 'counts': counts}
+
+
+@st.cache_data(max_entries=sample_cache_entries)
+@shared
+def build_quantile_sketches(_wells, version, sample_size, alpha=sketch_alpha):
+    """Partition sketches of the downsampled wells inside the slider limits,
+    built once per dataset version and sample size; filter states are
+    answered from them. Wells the range sliders drop even at their defaults,
+    e.g. with a missing depth, are left out so the default view still merges."""
+    return sketch_frame(_wells[sample_mask(_wells, version, sample_size)
+                               & range_mask(_wells, version, range_bounds)], alpha)
+
+
+@st.cache_data
+@shared
+def rebuild_quantile_sketches(_df, version, filters, alpha=sketch_alpha):
+    """Partition sketches of the filtered wells, for the filters that cut
+    through partitions."""
+    return sketch_frame(_df, alpha)
+
+
+def merge_partitions(sketches, partition_ids):
+    """The sketches restricted to ``partition_ids``; only bucket counts are read."""
+    return {'alpha': sketches['alpha'],
+            'partitions': sketches['partitions'].loc[partition_ids],
+            'counts': {column: counts[counts['partition'].isin(partition_ids)]
+                       for column, counts in sketches['counts'].items()}}
+
+
+def completion_sketches(_wells, _df, version, filters):
+    """Partition sketches of the filtered wells ``_df``.
+
+    The sub-play, fluid type and drilling year filters select partitions of
+    the sketches of the whole sample within the slider limits. The range sliders (TVD, lateral length,
+    proppant, frac fluid) and date bounds inside a year cut through
+    partitions; when they drop any well, the sketches are rebuilt from the
+    filtered rows instead.
+    """
+    sketches = build_quantile_sketches(_wells, version, filters['sample_size'])
+    partitions = sketches['partitions']
+    chosen = partitions.index[partitions['sub_play_name'].isin(filters['sub_plays'])
+                              & partitions['Fluid_type'].isin(filters['fluid_types'])
+                              & partitions['year'].between(filters['dates'][0].year, filters['dates'][1].year)]
+    # the filtered wells always lie in the chosen partitions, so equal counts
+    # mean the filters dropped no well inside them
+    if partitions.loc[chosen, 'wells'].sum() == len(_df):
+        return merge_partitions(sketches, chosen)
+    return rebuild_quantile_sketches(_df, version, filters)
+
+
+def sketch_quantiles(sketches, column, partition_ids=None, by=(), quantiles=completion_quantiles):
+    """Quantiles of ``column`` from the merged sketches of ``partition_ids``
+    (all partitions by default), one row per ``by`` group of partition keys."""
+    counts = sketches['counts'][column]
+    if partition_ids is not None:
+        counts = counts[counts['partition'].isin(partition_ids)]
+
+    by = list(by) or ['all']
+    merged = counts.join(sketches['partitions'].assign(all=0)[by], on='partition'
+                         ).groupby(by + ['bucket'], dropna=False)['count'].sum().reset_index()
+    cumulative = merged.groupby(by, dropna=False)['count'].cumsum()
+    total = merged.groupby(by, dropna=False)['count'].transform('sum')
+
+    gamma = (1 + sketches['alpha']) / (1 - sketches['alpha'])
+    result = {}
+    for name, q in quantiles.items():
+        bucket = merged[cumulative > q * (total - 1)].groupby(by, dropna=False)['bucket'].first()
+        result[name] = 2 * np.exp(bucket * np.log(gamma)) / (gamma + 1)
+
+    return pd.DataFrame(result).reset_index(drop=by == ['all'])
+
+
+def sketch_median(sketches, column):
+    """Median of ``column`` over every partition, NaN when there are no wells."""
+    median = sketch_quantiles(sketches, column, quantiles={'q50': 0.5})['q50']
+    return median.iloc[0] if len(median) else np.nan
+
+
+def completion_stats(grouped):
+    """Well count and the count and mean of each completion column per group."""
+    stats = [grouped['api_number'].count().rename('wells')]
+    for column in completion_columns:
+        stats.append(grouped[column].count().rename(f'{column}_count'))
+        stats.append(grouped[column].mean().rename(f'{column}_mean'))
+    return pd.concat(stats, axis=1)
+
+
+@st.cache_data
+@shared
+def operator_summary(_wells, _df, version, filters):
+    """Completion stats per operator and per operator and drilling year.
+
+    Wells are ranked by their full count, while the completion stats leave out
+    the frac fluid and proppant outliers, as the operator charts always have.
+    Quartiles come from the partition sketches.
+    """
+    trimmed = completion_frame(_df)
+    sketches = completion_sketches(_wells, _df, version, filters)
+
+    operators = completion_stats(trimmed.groupby('operator_name'))
+    yearly = completion_stats(trimmed.groupby(['operator_name', 'year']))
+    for column in completion_columns:
+        operators = operators.join(sketch_quantiles(sketches, column, by=['operator_name']
+                                                    ).set_index('operator_name').add_prefix(f'{column}_'))
+        yearly = yearly.join(sketch_quantiles(sketches, column, by=['operator_name', 'year']
+                                              ).set_index(['operator_name', 'year']).add_prefix(f'{column}_'))
+
+    return operators.sort_values('wells', ascending=False), yearly.reset_index()
+
+
+@st.cache_data
+@shared
+def operator_bands(_wells, _df, version, filters, operators):
+    """Yearly quartiles across all of ``operators`` together, merged from sketches."""
+    sketches = completion_sketches(_wells, _df, version, filters)
+    partitions = sketches['partitions']
+    chosen = partitions.index[partitions['operator_name'].isin(operators)]
+    bands = [sketch_quantiles(sketches, column, chosen, by=['year']
+                              ).set_index('year').add_prefix(f'{column}_')
+             for column in completion_columns]
+    return pd.concat(bands, axis=1).reset_index()
+
+
+# -- spatial helpers ------
+tvd_grid_cell = 0.03  # degrees
+tvd_neighbours = 12
+spacing_radius_miles = 0.5
+spacing_bin_miles = 0.1
+
+
+def located_rows(_wells):
+    """Row positions of the wells with a tophole location."""
+    return np.flatnonzero(_wells['tophole_longitude__deg'].notna()
+                          & _wells['tophole_latitude__deg'].notna())
+
+
+@st.cache_resource(max_entries=version_cache_entries)
+def well_index(_wells, version):
+    """KD-tree over the projected tophole location of every located well.
+
+    Returns the tree with the row positions of the wells it holds.
+    """
+    located = located_rows(_wells)
+    return cKDTree(project_miles(_wells['tophole_longitude__deg'].iloc[located],
+                                 _wells['tophole_latitude__deg'].iloc[located])), located
+
+
+# the projection is within a few percent of haversine across the basin, so
+# tree searches are widened by this factor before the exact distance check
+projection_slack = 1.05
+
+
+def wells_within(_wells, version, lon, lat, radius):
+    """Row positions and haversine distances of the wells within ``radius``
+    miles of a point, nearest first; none for a point without a location."""
+    if not np.isfinite([lon, lat]).all():
+        return np.array([], dtype=int), np.array([])
+    tree, located = well_index(_wells, version)
+    candidates = located[np.asarray(tree.query_ball_point(project_miles([lon], [lat])[0],
+                                                          r=radius * projection_slack),
+                                    dtype=int)]
+    distance = haversine_miles(lon, lat,
+                               _wells['tophole_longitude__deg'].to_numpy()[candidates],
+                               _wells['tophole_latitude__deg'].to_numpy()[candidates])
+    order = np.argsort(distance)
+    order = order[distance[order] <= radius]
+    return candidates[order], distance[order]
+
+
+def nearest_wells(_wells, version, lon, lat, k):
+    """Row positions and haversine distances of the ``k`` wells nearest a point."""
+    tree, located = well_index(_wells, version)
+    k = min(k, len(located))
+    if k == 0 or not np.isfinite([lon, lat]).all():
+        return np.array([], dtype=int), np.array([])
+
+    _, index = tree.query(project_miles([lon], [lat])[0], k=k)
+    reach = haversine_miles(lon, lat,
+                            _wells['tophole_longitude__deg'].to_numpy()[located[np.atleast_1d(index)]],
+                            _wells['tophole_latitude__deg'].to_numpy()[located[np.atleast_1d(index)]]).max()
+    # re-search the exact k-th distance so projection error cannot drop a closer well
+    positions, distance = wells_within(_wells, version, lon, lat, reach)
+    return positions[:k], distance[:k]
+
+
+@st.cache_data(max_entries=version_cache_entries)
+@shared
+def well_spacing(_wells, version, radius=spacing_radius_miles):
+    """Nearest earlier-drilled (parent) well distance and the count of offsets
+    within ``radius`` miles for every located well, indexed like ``_wells``."""
+    located = located_rows(_wells)
+    started = pd.to_datetime(_wells['drilling_start_date'].iloc[located])
+    day = (started - pd.Timestamp('1970-01-01')).dt.days.fillna(-1).astype(np.int64)
+
+    parent_distance, offsets = spacing_table(_wells['tophole_longitude__deg'].iloc[located],
+                                             _wells['tophole_latitude__deg'].iloc[located],
+                                             day.to_numpy(),
+                                             radius)
+    return pd.DataFrame({'parent_distance_mi': parent_distance,
+                         'offsets_within': offsets},
+                        index=_wells.index[located])
+
+
+@st.cache_data(max_entries=version_cache_entries)
+@shared
+def tvd_surface(_wells, version):
+    """Interpolate tvd__ft onto a regular lon/lat grid by inverse-distance weighting.
+
+    Each grid node averages its nearest wells, found with one vectorized
+    KD-tree query, weighted by 1 / distance**2. Only wells within two grid
+    cells count, and nodes with none are left out of the surface.
+    """
+    known = _wells.dropna(subset=['tophole_longitude__deg', 'tophole_latitude__deg', 'tvd__ft'])
+    if known.empty:
+        return pd.DataFrame(columns=['lon', 'lat', 'tvd__ft'])
+
+    tree = cKDTree(project_miles(known['tophole_longitude__deg'], known['tophole_latitude__deg']))
+
+    def axis(values):
+        start = np.floor(values.min() / tvd_grid_cell) * tvd_grid_cell
+        return np.arange(start, values.max() + tvd_grid_cell, tvd_grid_cell) + tvd_grid_cell / 2
+
+    grid_lon, grid_lat = np.meshgrid(axis(known['tophole_longitude__deg']),
+                                     axis(known['tophole_latitude__deg']))
+    grid_lon, grid_lat = grid_lon.ravel(), grid_lat.ravel()
+
+    distance, index = tree.query(project_miles(grid_lon, grid_lat),
+                                 k=min(tvd_neighbours, len(known)),
+                                 distance_upper_bound=2 * tvd_grid_cell * miles_per_degree)
+    distance = distance.reshape(len(grid_lon), -1)
+    index = index.reshape(len(grid_lon), -1)
+
+    # missing neighbours come back as (inf, len(known)); pad so they index a zero weight
+    tvd_known = np.append(known['tvd__ft'].to_numpy(dtype=float), 0)
+    weight = np.where(np.isfinite(distance), 1 / np.maximum(distance, 1e-3) ** 2, 0)
+    total = weight.sum(axis=1)
+    covered = total > 0
+
+    return pd.DataFrame({
+        'lon': grid_lon[covered].round(4),
+        'lat': grid_lat[covered].round(4),
+        'tvd__ft': ((weight * tvd_known[index]).sum(axis=1)[covered] / total[covered]).round(0)})
+
+
+@st.cache_data
+@shared
+def well_outlines(_df, version, filters):
+    """Convex hull of the tophole locations of each sub-play and each fluid type.
+
+    Returns the records of each grouping column, one per group with its well
+    count and a GeoJSON polygon. Rings wind clockwise, which d3-geo reads as
+    the polygon itself rather than the rest of the globe.
+    """
+    located = _df.dropna(subset=['tophole_longitude__deg', 'tophole_latitude__deg'])
+    outlines = {}
+    for column in ['sub_play_name', 'Fluid_type']:
+        outlines[column] = []
+        for name, group in located.groupby(column):
+            points = np.unique(group[['tophole_longitude__deg', 'tophole_latitude__deg']].to_numpy(dtype=float),
+                               axis=0)
+            try:
+                hull = ConvexHull(points)
+            except (QhullError, ValueError):
+                # fewer than three wells, or all of them on a line
+                continue
+            ring = points[hull.vertices[::-1]]
+            outlines[column].append({
+                column: name,
+                'wells': len(group),
+                'geo': {'type': 'Feature',
+                        'geometry': {'type': 'Polygon',
+                                     'coordinates': [np.vstack([ring, ring[:1]]).round(4).tolist()]},
+                        'properties': {}}})
+    return outlines
+
+
+# -- decline curves ------
+days_per_month = 365.25 / 12
+forecast_months = np.unique(np.round(np.geomspace(1, 360, 48)))
+
+
+def fit_decline(_wells):
+    """Hyperbolic Arps fit of every well to its cumulative BOE at 30 and 90 days
+    and its total EUR, taken as produced over ``eur_life_days``."""
+    cum = np.column_stack([_wells['cum30_oil__bl'] + _wells['cum30_gas__mcf'] / 6,
+                           _wells['cum90_total__be'],
+                           _wells['eur_total__mbe'] * 10 ** 6])
+    t = np.broadcast_to([30, 90, eur_life_days], cum.shape)
+    return pd.DataFrame(fit_arps(t, cum),
+                        columns=['qi', 'di', 'b', 'fit_error'],
+                        index=_wells.index)
+
+
+def decline_parameters(dataset):
+    """Decline fit of every well, fitted once per server; deltas refit only the
+    wells they change (see apply_delta)."""
+    with dataset['lock']:
+        if dataset['decline'] is None:
+            dataset['decline'] = fit_decline(dataset['wells'])
+        return dataset['decline']
+
+
+@st.cache_data
+@shared
+def decline_forecast(_df, _params, version, filters):
+    """Quartiles of the forecast cumulative production (MBOE) by Fluid_type and month."""
+    params = _params.loc[_df.index]
+    cum = arps_cumulative(forecast_months * days_per_month,
+                          params[['qi']].to_numpy(),
+                          params[['di']].to_numpy(),
+                          params[['b']].to_numpy()) / 10 ** 3
+
+    forecasts = []
+    for fluid, rows in _df.groupby('Fluid_type').indices.items():
+        fitted = cum[rows][~np.isnan(cum[rows]).any(axis=1)]
+        if not len(fitted):
+            continue
+        q25, q50, q75 = np.percentile(fitted, [25, 50, 75], axis=0)
+        forecasts.append(pd.DataFrame({'Fluid_type': fluid,
+                                       'years': forecast_months / 12,
+                                       'q25': q25, 'q50': q50, 'q75': q75,
+                                       'wells': len(fitted)}))
+
+    return pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(
+        columns=['Fluid_type', 'years', 'q25', 'q50', 'q75', 'wells'])
+
+
+# P10 is the high case: 10% of wells are expected to do better
+type_curve_percentiles = {'P90': 10, 'P50': 50, 'P10': 90}
+
+
+@st.cache_data
+@shared
+def type_curves(_df, _params, version, filters):
+    """P10/P50/P90 forecast cumulative production per lateral foot (BOE/ft)
+    by month for every sub-play and fluid type group of the filtered wells.
+
+    All groups are built at once, so switching the displayed group only
+    filters this table.
+    """
+    params = _params.loc[_df.index]
+    cum = arps_cumulative(forecast_months * days_per_month,
+                          params[['qi']].to_numpy(),
+                          params[['di']].to_numpy(),
+                          params[['b']].to_numpy()) / _df[['lateral_length__ft']].to_numpy()
+    cum[~np.isfinite(cum)] = np.nan
+
+    curves = []
+    for (sub_play, fluid), rows in _df.groupby(['sub_play_name', 'Fluid_type']).indices.items():
+        fitted = cum[rows][~np.isnan(cum[rows]).any(axis=1)]
+        if not len(fitted):
+            continue
+        percentiles = np.percentile(fitted, list(type_curve_percentiles.values()), axis=0)
+        curves.append(pd.DataFrame({'sub_play_name': sub_play,
+                                    'Fluid_type': fluid,
+                                    'years': np.tile(forecast_months / 12, len(percentiles)),
+                                    'case': np.repeat(list(type_curve_percentiles), len(forecast_months)),
+                                    'boe_per_ft': percentiles.ravel(),
+                                    'wells': len(fitted)}))
+
+    return pd.concat(curves, ignore_index=True) if curves else pd.DataFrame(
+        columns=['sub_play_name', 'Fluid_type', 'years', 'case', 'boe_per_ft', 'wells'])
+
+
+# -- economics ------
+royalty = 0.25
+economics_chunk_wells = 10000
+
+
+@st.cache_data
+@shared
+def discount_factors(_df, _params, version, filters, discount_rate):
+    """Discounted share of each well's EUR: its monthly Arps volumes as a
+    fraction of the life total, discounted at ``discount_rate`` a year.
+
+    NPV is linear in price, so this one factor per well prices every scenario.
+    """
+    params = _params.loc[_df.index, ['qi', 'di', 'b']].to_numpy()
+    months = np.arange(1, round(eur_life_days / days_per_month) + 1)
+    discount = (1 + discount_rate) ** -(months / 12)
+
+    factors = np.empty(len(params))
+    for start in range(0, len(params), economics_chunk_wells):
+        chunk = params[start:start + economics_chunk_wells]
+        cum = arps_cumulative(months * days_per_month, chunk[:, :1], chunk[:, 1:2], chunk[:, 2:])
+        monthly = np.diff(cum, axis=1, prepend=0) / cum[:, -1:]
+        factors[start:start + economics_chunk_wells] = monthly @ discount
+    return factors
+
+
+def well_economics(_df, factors, oil_prices, gas_price):
+    """Gross revenue and NPV ($) of every well (rows) under every oil price
+    scenario (columns), and each well's breakeven oil price ($/bbl)."""
+    oil = _df['eur_oil__mbl'].to_numpy(dtype=float) * 10 ** 6
+    gas_revenue = _df['eur_gas__bf3'].to_numpy(dtype=float) * 10 ** 6 * gas_price
+    cost = _df['total_cost__ud'].to_numpy(dtype=float)
+
+    revenue = oil[:, None] * np.asarray(oil_prices, dtype=float)[None, :] + gas_revenue[:, None]
+    npv = (1 - royalty) * factors[:, None] * revenue - cost[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        breakeven = (cost / ((1 - royalty) * factors) - gas_revenue) / oil
+    return revenue, npv, np.where(np.isfinite(breakeven), breakeven, np.nan)
+
+
+# -- completion design regressions ------
+regression_features = {'norm_proppant': 'Proppant wt. (lb/ft)',
+                       'norm_fracture_fluid': 'Frac Fluid (gl/ft)',
+                       'lateral_length__ft': 'Lateral Length (ft)'}
+regression_min_wells = 10
+dependence_points = 25
+
+
+@st.cache_data
+@shared
+def completion_regressions(_df, version, filters):
+    """Least-squares fits of eur_total__mbe on the completion design for every
+    operator and every sub-play, solved together as one batch.
+
+    Each group's normal equations are summed from the rows in one sorted pass
+    and the whole stack is solved with a batched pseudo-inverse. Returns the
+    coefficients with R² per group, and linear partial-dependence curves of
+    each feature over its 5th to 95th percentile, the other features held at
+    the group mean.
+    """
+    features = list(regression_features)
+    data = _df[features + ['eur_total__mbe', 'operator_name', 'sub_play_name']].dropna()
+    stacked = pd.concat([data.assign(grouping='Operator', group=data['operator_name']),
+                         data.assign(grouping='Sub-play', group=data['sub_play_name'])],
+                        ignore_index=True)
+    stacked = stacked[stacked.groupby(['grouping', 'group'])['eur_total__mbe'].transform('size')
+                      >= regression_min_wells].sort_values(['grouping', 'group'], kind='stable')
+    if stacked.empty:
+        return (pd.DataFrame(columns=['grouping', 'group', 'wells', 'intercept', 'r2'] + features),
+                pd.DataFrame(columns=['grouping', 'group', 'feature', 'value', 'eur_total__mbe']))
+
+    keys = stacked[['grouping', 'group']].drop_duplicates()
+    starts = np.flatnonzero(~stacked[['grouping', 'group']].duplicated())
+    x = np.column_stack([np.ones(len(stacked)), stacked[features].to_numpy(dtype=float)])
+    y = stacked['eur_total__mbe'].to_numpy(dtype=float)
+
+    def group_sums(values):
+        return np.add.reduceat(values, starts, axis=0)
+
+    wells = group_sums(np.ones(len(y)))
+    xtx = group_sums(x[:, :, None] * x[:, None, :])
+    xty = group_sums(x * y[:, None])
+    yty, y_sum = group_sums(y ** 2), group_sums(y)
+
+    beta = (np.linalg.pinv(xtx) @ xty[:, :, None])[:, :, 0]
+    sse = yty - 2 * (beta * xty).sum(axis=1) + np.einsum('gi,gij,gj->g', beta, xtx, beta)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = 1 - sse / (yty - y_sum ** 2 / wells)
+
+    coefficients = keys.reset_index(drop=True).assign(wells=wells.astype(int),
+                                                      intercept=beta[:, 0],
+                                                      r2=r2)
+    coefficients[features] = beta[:, 1:]
+
+    # partial dependence of a linear model: the feature's own term moves, the
+    # others stay at the group mean
+    means = group_sums(x)[:, 1:] / wells[:, None]
+    spans = stacked.groupby(['grouping', 'group'])[features].quantile([0.05, 0.95]).unstack(
+    ).reindex(pd.MultiIndex.from_frame(keys))
+    low = np.column_stack([spans[(f, 0.05)] for f in features])
+    high = np.column_stack([spans[(f, 0.95)] for f in features])
+    grid = low[:, :, None] + (high - low)[:, :, None] * np.linspace(0, 1, dependence_points)
+    centre = beta[:, 0] + (beta[:, 1:] * means).sum(axis=1)
+    curves = centre[:, None, None] + beta[:, 1:, None] * (grid - means[:, :, None])
+
+    dependence = pd.DataFrame({
+        'grouping': np.repeat(keys['grouping'].to_numpy(), len(features) * dependence_points),
+        'group': np.repeat(keys['group'].to_numpy(), len(features) * dependence_points),
+        'feature': np.tile(np.repeat([regression_features[f] for f in features], dependence_points), len(keys)),
+        'value': grid.ravel(),
+        'eur_total__mbe': curves.ravel()})
+    return coefficients, dependence
+
+
+# -- export ------
+# files here are streamed from disk by Streamlit's static file serving
+export_dir = Path(__file__).parent / 'static' / 'exports'
+export_chunk_rows = 50000
+export_keep_files = 20
+
+
+def export_schema(_wells, columns):
+    """Parquet schema of ``columns`` of the whole table.
+
+    Object columns are typed from their values, not from one chunk, so a
+    chunk in which such a column is all null still fits the schema.
+    """
+    schema = pa.Schema.from_pandas(_wells[columns].iloc[:0], preserve_index=False)
+    for column in columns:
+        values = _wells[column].dropna()
+        if schema.field(column).type == pa.null() and len(values):
+            schema = schema.set(schema.get_field_index(column),
+                                pa.field(column, pa.array(values.iloc[:1000]).type))
+    return schema
+
+
+def export_wells(_wells, version, filters, rows, columns, file_format):
+    """Write the wells at ``rows`` to a CSV or Parquet file under ``export_dir``,
+    ``export_chunk_rows`` at a time, and return the file name.
+
+    Only one chunk is in memory at once. Files are keyed by dataset version,
+    filter state, columns and format, so a repeated export is not rewritten,
+    and only the newest ``export_keep_files`` are kept.
+    """
+    key = hashlib.sha1(repr((version, sorted(filters.items()), columns, file_format)).encode()).hexdigest()[:16]
+    path = export_dir / f'wells_{key}.{file_format}'
+    if path.exists():
+        return path.name
+
+    export_dir.mkdir(parents=True, exist_ok=True)
+    # a temporary file of our own, so concurrent exports never share one
+    handle, partial = tempfile.mkstemp(dir=export_dir, suffix='.partial')
+    try:
+        with os.fdopen(handle, 'w' if file_format == 'csv' else 'wb') as file:
+            writer = None if file_format == 'csv' else pq.ParquetWriter(file, export_schema(_wells, columns))
+            try:
+                for start in range(0, max(len(rows), 1), export_chunk_rows):
+                    chunk = _wells.iloc[rows[start:start + export_chunk_rows]][columns]
+                    if writer is None:
+                        chunk.to_csv(file, header=start == 0, index=False, lineterminator='\n')
+                    else:
+                        writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False,
+                                                                schema=writer.schema))
+            finally:
+                if writer is not None:
+                    writer.close()
+        # publish atomically so a concurrent session never serves a partial file
+        os.replace(partial, path)
+    finally:
+        Path(partial).unlink(missing_ok=True)
+    finished = [p for p in export_dir.glob('wells_*') if p.suffix != '.partial']
+    for stale in sorted(finished, key=lambda p: p.stat().st_mtime)[:-export_keep_files]:
+        stale.unlink(missing_ok=True)
+    return path.name
+
+
+# -- pre-rendered snapshots ------
+# written by prerender.py for each filter preset, served when the app state matches
+snapshot_dir = Path(__file__).parent / 'snapshots'
+# off while prerender.py runs the app, so it always builds the charts from data
+use_snapshots = os.environ.get('EF_SNAPSHOTS', '1') != '0'
+
+
+def snapshot_file(version, preset):
+    return snapshot_dir / version / f"{hashlib.sha1(preset.encode()).hexdigest()[:12]}.json"
+
+
+def snapshot_key(state):
+    """JSON round trip of a state dict, so it compares equal to a stored one."""
+    return json.loads(json.dumps(state, default=str))
+
+
+@st.cache_data
+def read_snapshot(path, mtime_ns):
+    """A snapshot file's specs, cached per modification time."""
+    return json.loads(Path(path).read_text())
+
+
+def load_snapshot(version, preset):
+    """The pre-rendered chart specs of ``preset``, or None when not rendered.
+
+    The file is looked up on every call, so a snapshot rendered while the
+    server runs is served from the next rerun on.
+    """
+    if not use_snapshots:
+        return None
+    path = snapshot_file(version, preset)
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    return read_snapshot(str(path), mtime_ns)
+
+
+dataset = load_wells()
+wells, dataset_version, group_versions = ingest_deltas(dataset)
+for delta_name, delta_error in list(dataset['rejected'].items()):
+    st.warning(f"Delta file {delta_name} was not applied ({delta_error})")
 
 color_cat = [
     "#83c9ff",
@@ -88,46 +1152,56 @@ fluid_type = [["Black Oil",
                'darkred',
                ]]
 
+# named starting points for the filters; prerender.py renders each of them
+filter_presets = {
+    'Whole play': {},
+    'Oil window': {'sub_plays': ['Black Oil', 'Karnes Trough', 'Northeast Oil', 'Maverick Oil']},
+    'Condensate window': {'sub_plays': ['Hawkville Condensate', 'Maverick Condensate', 'Edwards Condensate']},
+    'Gas window': {'sub_plays': ['Southwest Gas', 'Southeast Gas']},
+}
+# the preset the page opens on, as set by prerender.py; unknown names fall back
+start_preset = os.environ.get('EF_PRESET', 'Whole play')
+if start_preset not in filter_presets:
+    start_preset = 'Whole play'
+
 st.divider()
 with st.expander("**Press here to view filters**"):
+    preset_name = st.selectbox(
+        '**Start from a preset:**',
+        list(filter_presets),
+        list(filter_presets).index(start_preset)
+    )
+    preset = filter_presets[preset_name]
+    draft_mode = st.checkbox('**Collect filter changes and apply them together**', True)
+
     _, row_filter1, _, row_filter2, _ = st.columns((0.1, 1, 0.1, 1, 0.1))
 
     with row_filter1:
 
-        sample_size = st.slider('Choose well Sample size: ', 0.1, 1.0, 0.25)
-
-        df = df.sample(frac=sample_size, random_state=1)
+        sample_size = st.slider('Choose well Sample size: ', 0.1, 1.0, preset.get('sample_size', 0.25))
 
         sub_filter = st.multiselect(
             '**Select sub-plays you are interested in:**',
             sub_plays,
-            sub_plays
+            preset.get('sub_plays', sub_plays)
         )
 
-        df = df[df['sub_play_name'].isin(sub_filter)]
-
         fluid_type_filter = st.multiselect(
             '**Select HC fluid type:**',
             fluid_type[0],
-            fluid_type[0]
+            preset.get('fluid_types', fluid_type[0])
         )
 
-        df = df[df['Fluid_type'].isin(fluid_type_filter)]
-
         tvd_slider = st.slider(
             '**Select the range of True Vertical Depth**',
-            min_value=0,
-            max_value=20000,
-            value=(0, 20000)
+            min_value=range_bounds['tvd'][0],
+            max_value=range_bounds['tvd'][1],
+            value=preset.get('tvd', range_bounds['tvd'])
         )
 
-        df = df[(df['tvd__ft'] > tvd_slider[0])
-                & (df['tvd__ft'] < tvd_slider[1])]
-
     with row_filter2:
-        min_date = date.fromisoformat('2009-01-01')  # str to datetime
-        max_date = date.fromisoformat('2023-01-01')
-        value = (min_date, max_date)
+        min_date, max_date = range_bounds['dates']
+        value = preset.get('dates', (min_date, max_date))
 
         date_slider = st.slider(
             '**Select the range of drilled wells dates:**',
@@ -135,38 +1209,113 @@ with st.expander("**Press here to view filters**"):
             max_value=max_date,
             value=value)
 
-        df = df[(df['drilling_start_date'] > date_slider[0])
-                & (df['drilling_start_date'] < date_slider[1])]
-
         lateral_slider = st.slider(
             '**Select the range of lateral length**',
-            min_value=0,
-            max_value=18000,
-            value=(0, 18000)
+            min_value=range_bounds['lateral'][0],
+            max_value=range_bounds['lateral'][1],
+            value=preset.get('lateral', range_bounds['lateral'])
         )
 
-        df = df[(df['lateral_length__ft'] > lateral_slider[0])
-                & (df['lateral_length__ft'] < lateral_slider[1])]
-
         pw_slider = st.slider(
             '**Select the range of Proppant Weight Concentration**',
-            min_value=0,
-            max_value=5000,
-            value=(0, 5000)
+            min_value=range_bounds['proppant'][0],
+            max_value=range_bounds['proppant'][1],
+            value=preset.get('proppant', range_bounds['proppant'])
         )
 
-        df = df[(df['norm_proppant'] > pw_slider[0])
-                & (df['norm_proppant'] < pw_slider[1])]
-
         ff_slider = st.slider(
             '**Select the range of Frac Fluid Concentration**',
-            min_value=0,
-            max_value=4000,
-            value=(0, 4000)
+            min_value=range_bounds['frac_fluid'][0],
+            max_value=range_bounds['frac_fluid'][1],
+            value=preset.get('frac_fluid', range_bounds['frac_fluid'])
         )
 
-        df = df[(df['norm_fracture_fluid'] > ff_slider[0])
-                & (df['norm_fracture_fluid'] < ff_slider[1])]
+    draft_filters = dict(sample_size=sample_size,
+                         sub_plays=tuple(sub_filter),
+                         fluid_types=tuple(fluid_type_filter),
+                         tvd=tvd_slider,
+                         dates=date_slider,
+                         lateral=lateral_slider,
+                         proppant=pw_slider,
+                         frac_fluid=ff_slider)
+
+    # in draft mode the charts keep the applied filters while the widgets
+    # change; the preview only counts matches on the filter index
+    filters = st.session_state.get('applied_filters', draft_filters) if draft_mode else draft_filters
+    if draft_filters != filters:
+        _, row_apply1, row_apply2, _ = st.columns((0.1, 0.4, 1.6, 0.1))
+        if row_apply1.button('Apply filters'):
+            st.session_state['applied_filters'] = draft_filters
+            st.experimental_rerun()
+        row_apply2.markdown(f"**{matching_mask(wells, dataset_version, draft_filters).sum():,} wells match** "
+                            f"the changed filters; the charts still show the applied ones")
+    st.session_state['applied_filters'] = filters
+
+rows = filter_rows(wells, dataset_version, filters)
+df = wells.iloc[rows]
+
+with row_filter1:
+    points_zoom = st.selectbox(
+        '**Zoom the well map to a sub-play:**',
+        ['Whole play'] + sub_plays
+    )
+    tvd_zoom = st.selectbox(
+        '**Zoom the depth map to a sub-play:**',
+        ['Whole play'] + sub_plays
+    )
+
+# every operator of the dataset, ranked by well count, so the widget and the
+# user's choice outlive filter changes; the choice is kept in session state
+operator_names = wells['operator_name'].value_counts().index.tolist()
+chosen_operators = [name for name in st.session_state.get('operators', operator_names[:5])
+                    if name in operator_names]
+with row_filter2:
+    top_operators_list = st.multiselect(
+        '**Select operators to compare:**',
+        operator_names,
+        chosen_operators
+    )
+st.session_state['operators'] = top_operators_list
+
+# everything the snapshot charts depend on
+snapshot_state = snapshot_key(dict(filters,
+                                   operators=tuple(top_operators_list),
+                                   tvd_zoom=tvd_zoom,
+                                   points_zoom=points_zoom))
+snapshot = load_snapshot(dataset_version, preset_name)
+if snapshot is not None and snapshot['state'] != snapshot_state:
+    snapshot = None
+
+# reruns that leave the charts' state alone, e.g. while filters are drafted,
+# reuse this session's specs; with those or a matching snapshot the data
+# work of the tab charts below is skipped
+tab_specs_key = (dataset_version, json.dumps(snapshot_state, sort_keys=True))
+if st.session_state.get('tab_specs_key') == tab_specs_key:
+    tab_specs = st.session_state['tab_specs']
+elif snapshot is not None:
+    tab_specs = snapshot['charts']
+    st.session_state['tab_specs_key'], st.session_state['tab_specs'] = tab_specs_key, tab_specs
+else:
+    tab_specs = None
+build_charts = tab_specs is None
+
+with st.expander("**Press here to export the filtered wells**"):
+    _, row_export1, _, row_export2, _ = st.columns((0.1, 2, 0.1, 1, 0.1))
+
+    export_columns = row_export1.multiselect(
+        '**Columns to export:**',
+        wells.columns.tolist(),
+        wells.columns.tolist()
+    )
+
+    export_format = row_export2.radio('**Format:**', ['csv', 'parquet'], horizontal=True)
+
+    if row_export2.button(f"Prepare {len(rows)} wells for download", disabled=not export_columns):
+        with st.spinner("Writing the export..."):
+            export_name = export_wells(wells, dataset_version, filters, rows, export_columns, export_format)
+        row_export2.markdown(f'<a href="app/static/exports/{export_name}" '
+                             f'download="eagle_ford_wells.{export_format}">Download the filtered wells</a>',
+                             unsafe_allow_html=True)
 
 states = alt.topo_feature(data.us_10m.url,
                           feature='states'
@@ -212,10 +1361,21 @@ background = alt.Chart(states).mark_geoshape(
 )
 
 # -----page 1------
+outlines = well_outlines(df, dataset_version, filters) if build_charts else {'sub_play_name': [], 'Fluid_type': []}
+
 map_select = alt.selection_interval(name='map_select',
                                     resolve="intersect"
                                     )
 
+# the whole play is drawn as sub-play outlines, which select by clicking;
+# individual wells, brushed by area, only when zoomed in
+outline_select = alt.selection_point(name='outline_select',
+                                     fields=['sub_play_name'],
+                                     resolve="intersect"
+                                     )
+points_wells = df[df['sub_play_name'] == points_zoom]
+overview_select = map_select if not points_wells.empty else outline_select
+
 count_select = alt.selection_point(name='count_select',
                                    encodings=['y'],
                                    resolve="intersect"
@@ -264,7 +1424,7 @@ subplay_well_count = alt.Chart(df,
 ).add_params(
     count_select
 ).transform_filter(
-    map_select
+    overview_select
 ).transform_filter(
     time_select
 ).interactive()
@@ -274,7 +1434,60 @@ points_title = alt.TitleParams("Eagle Ford Map of Well Locations",
                                fontSize=20,
                                )
 
-points = alt.Chart(df,
+points_xmin, points_xmax, points_ymin, points_ymax = xmin, xmax, ymin, ymax
+
+if not points_wells.empty:
+    points_xmin, points_xmax, points_ymin, points_ymax = (
+        points_wells['tophole_longitude__deg'].min(),
+        points_wells['tophole_longitude__deg'].max(),
+        points_wells['tophole_latitude__deg'].min(),
+        points_wells['tophole_latitude__deg'].max()
+    )
+    # wells of other sub-plays inside the zoomed box are drawn too
+    points_wells = df[df['tophole_longitude__deg'].between(points_xmin, points_xmax)
+                      & df['tophole_latitude__deg'].between(points_ymin, points_ymax)]
+
+points_extent = {
+    "type": "Feature",
+    "geometry": {"type": "Polygon",
+                 "coordinates": [[
+                     [points_xmax, points_ymax],
+                     [points_xmax, points_ymin],
+                     [points_xmin, points_ymin],
+                     [points_xmin, points_ymax],
+                     [points_xmax, points_ymax]]]
+                 },
+    "properties": {}
+}
+
+points_background = background.project('albersUsa',
+                                       fit=points_extent
+                                       )
+
+points_outlines = alt.Chart(alt.Data(values=outlines['sub_play_name']),
+                            title=points_title
+                            ).mark_geoshape(
+    fillOpacity=0.6,
+    stroke='white',
+    strokeWidth=1
+).encode(
+    shape='geo:G',
+    color=alt.condition(outline_select,
+                        'sub_play_name:N',
+                        alt.value('darkgrey'),
+                        legend=None),
+    tooltip=['sub_play_name:N',
+             alt.Tooltip('wells:Q', title='Wells')]
+).properties(
+    width=map_width,
+    height=map_height
+).add_params(
+    outline_select
+).transform_filter(
+    count_select
+)
+
+points = alt.Chart(points_wells,
                    title=points_title
                    ).mark_circle(
     size=10,
@@ -300,6 +1513,8 @@ points = alt.Chart(df,
     time_select
 ).interactive()
 
+points_map = points_background + (points if overview_select is map_select else points_outlines)
+
 drill_time_title = alt.TitleParams("Wells Drilled Quarterly",
                                    anchor="middle",
                                    fontSize=20,
@@ -325,10 +1540,40 @@ drill_time = alt.Chart(data=df,
 ).transform_filter(
     count_select
 ).transform_filter(
-    map_select
+    overview_select
 )
 
-overview_viz = alt.hconcat(background + points,
+timelapse = drilling_timelapse(df, dataset_version, filters)
+timelapse_quarters = timelapse['quarter'].drop_duplicates().to_numpy()
+timelapse_peak = timelapse.groupby(['cell_lon', 'cell_lat'])['wells'].sum().max() if len(timelapse) else 1
+timelapse_span = [alt.DateTime(year=pd.Timestamp(q).year, quarter=pd.Timestamp(q).quarter)
+                  for q in timelapse_quarters[[0, -1]]] if len(timelapse) else None
+# fixed scales, so the map does not rescale while frames stream in
+timelapse_cells = alt.Chart(alt.NamedData('timelapse')).mark_square(
+    opacity=0.85
+).encode(
+    longitude='cell_lon:Q',
+    latitude='cell_lat:Q',
+    size=alt.Size('sum(wells):Q',
+                  title='Wells drilled',
+                  scale=alt.Scale(domain=[0, timelapse_peak],
+                                  range=[4, 120])),
+    color=alt.Color('max(quarter):T',
+                    title='Latest well',
+                    scale=alt.Scale(scheme='viridis',
+                                    domain=timelapse_span)),
+    tooltip=[alt.Tooltip('sum(wells):Q', title='Wells drilled'),
+             alt.Tooltip('max(quarter):T', title='Latest well', format='%Y Q%q')]
+).properties(
+    width=map_width,
+    height=map_height
+)
+
+timelapse_viz = (background + timelapse_cells).configure(
+    background='#262730'
+)
+
+overview_viz = alt.hconcat(points_map,
                            subplay_well_count & drill_time,
                            ).configure_concat(
     spacing=20
@@ -372,13 +1617,48 @@ overview_viz = alt.hconcat(background + points,
 # ----- Page 2 -----
 map2_width = 880
 map2_height = 500
+# the surface is drawn for the whole play; individual wells only when zoomed in
+tvd_wells = df[df['sub_play_name'] == tvd_zoom]
+tvd_xmin, tvd_xmax, tvd_ymin, tvd_ymax = xmin, xmax, ymin, ymax
+
+if not tvd_wells.empty:
+    tvd_xmin, tvd_xmax, tvd_ymin, tvd_ymax = (
+        tvd_wells['tophole_longitude__deg'].min(),
+        tvd_wells['tophole_longitude__deg'].max(),
+        tvd_wells['tophole_latitude__deg'].min(),
+        tvd_wells['tophole_latitude__deg'].max()
+    )
+
+tvd_extent = {
+    "type": "Feature",
+    "geometry": {"type": "Polygon",
+                 "coordinates": [[
+                     [tvd_xmax, tvd_ymax],
+                     [tvd_xmax, tvd_ymin],
+                     [tvd_xmin, tvd_ymin],
+                     [tvd_xmin, tvd_ymax],
+                     [tvd_xmax, tvd_ymax]]]
+                 },
+    "properties": {}
+}
+
+surface = tvd_surface(wells, group_versions['tvd']) if build_charts else pd.DataFrame(columns=['lon', 'lat', 'tvd__ft'])
+surface = surface[surface['lon'].between(tvd_xmin, tvd_xmax)
+                  & surface['lat'].between(tvd_ymin, tvd_ymax)]
+
+tvd_pixels_per_degree = min(
+    map2_width / (max(tvd_xmax - tvd_xmin, tvd_grid_cell)
+                  * np.cos(np.radians(basin_latitude))),
+    map2_height / max(tvd_ymax - tvd_ymin, tvd_grid_cell)
+)
+
 tvd_background = alt.Chart(states).mark_geoshape(
     fill='gray',
     stroke='white',
     clip=True,
     tooltip=False,
 ).project('albersUsa',
-          fit=extent
+          fit=tvd_extent
           ).properties(
     width=map2_width,
     height=map2_height
@@ -389,9 +1669,27 @@ tvd_title = alt.TitleParams("Eagle Ford Map of Well True Vertical Depth",
                             fontSize=20,
                             )
 
-tvd = alt.Chart(df, title=tvd_title).mark_circle(
+tvd_raster = alt.Chart(surface, title=tvd_title).mark_square(
+    size=(tvd_grid_cell * tvd_pixels_per_degree) ** 2,
+    opacity=0.9,
+    clip=True
+).encode(
+    longitude='lon:Q',
+    latitude='lat:Q',
+    color=alt.Color('tvd__ft:Q',
+                    scale=alt.Scale(scheme='redblue', domain=[5000, 15000])),
+    tooltip=[alt.Tooltip('tvd__ft', title='Interpolated TVD (ft)'),
+             'lon',
+             'lat']
+).properties(
+    width=map2_width,
+    height=map2_height
+)
+
+tvd = alt.Chart(tvd_wells).mark_circle(
     size=10,
-    color='steelblue'
+    stroke='black',
+    strokeWidth=0.5
 ).encode(
     longitude='tophole_longitude__deg:Q',
     latitude='tophole_latitude__deg:Q',
@@ -403,21 +1701,19 @@ tvd = alt.Chart(df, title=tvd_title).mark_circle(
 ).properties(
     width=map2_width,
     height=map2_height
-).interactive()
+)
 
-tvd_map = tvd_background + tvd
+tvd_map = tvd_background + tvd_raster + tvd
 
 tvd_map = (tvd_map | alt.Chart().mark_point()).configure(
     background='#262730'
 )
 
-top_operators = df.groupby('operator_name'
-                           )['api_number'].count(
-).sort_values(
-    ascending=False)
-
-top_operators_list = top_operators[:5].index.copy()
-top_operators_list = [x for x in top_operators_list]
+operator_colors = [color_cat[i % len(color_cat)] for i in range(len(top_operators_list))]
+op_yearly = (operator_summary(wells, df, dataset_version, filters)[1] if build_charts
+             else pd.DataFrame(columns=['operator_name', 'year']))
+op_yearly = op_yearly[op_yearly['operator_name'].isin(top_operators_list)]
+op_bands = operator_bands(wells, df, dataset_version, filters, tuple(top_operators_list)) if build_charts else pd.DataFrame()
 
 df_op = df[df['operator_name'].isin(top_operators_list)]
 df_op = df_op[df_op['norm_fracture_fluid'] < 4000]  # filter outliers
@@ -430,6 +1726,7 @@ op_ll_vio_dropdown = alt.binding_select(
 )
 
 op_vio_select = alt.selection_single(
+    name='op_vio_select',
     fields=['operator_name'],
     bind=op_ll_vio_dropdown,
 )
@@ -439,6 +1736,67 @@ line_select = alt.selection_interval(name="line_select",
                                      resolve="intersect"
                                      )
 
+
+# with "All" operators the band merges the chosen operators' sketches,
+# otherwise it is the selected operator's own band
+op_selected = "length(data('op_vio_select_store')) > 0"
+
+
+def operator_trend(column, title):
+    """Yearly mean line and IQR band from the operator summary and sketches."""
+    line = alt.Chart(op_yearly).transform_filter(
+        op_vio_select
+    ).transform_calculate(
+        total=f'datum.{column}_mean * datum.{column}_count'
+    ).transform_aggregate(
+        total='sum(total)',
+        count=f'sum({column}_count)',
+        groupby=['year']
+    ).transform_calculate(
+        mean='datum.total / datum.count'
+    ).mark_line().encode(
+        x=alt.X('year:Q',
+                title='Year',
+                axis=alt.Axis(format='d')),
+        y=alt.Y('mean:Q',
+                title=title),
+        color=alt.value("#FD8D14")
+    )
+
+    band = alt.Chart(op_yearly).mark_area(
+        opacity=0.3
+    ).encode(
+        x='year:Q',
+        y=alt.Y(f'{column}_q25:Q').title(''),
+        y2=f'{column}_q75:Q',
+        color=alt.value("#FD8D14")
+    ).add_params(
+        op_vio_select
+    ).transform_filter(
+        op_vio_select
+    ).transform_filter(
+        op_selected
+    )
+
+    all_band = alt.Chart(op_bands).mark_area(
+        opacity=0.3
+    ).encode(
+        x='year:Q',
+        y=alt.Y(f'{column}_q25:Q').title(''),
+        y2=f'{column}_q75:Q',
+        color=alt.value("#FD8D14")
+    ).transform_filter(
+        f"!({op_selected})"
+    )
+
+    return (all_band + band + line
+            ).transform_filter(
+        'datum.year >= 2009'
+    ).properties(
+        width=275,
+    )
+
+
 op_ll_vio = alt.Chart(data=df_op).transform_density(
     'lateral_length__ft',
     as_=['lateral_length__ft',
@@ -468,13 +1826,7 @@ op_ll_vio = alt.Chart(data=df_op).transform_density(
                         alt.Color('operator_name:N',
                                   scale=alt.Scale(
                                       domain=top_operators_list,
-                                      range=[
-                                          "#83c9ff",
-                                          "#0068c9",
-                                          "#ffabab",
-                                          "#ff2b2b",
-                                          "#7defa1",
-                                      ])
+                                      range=operator_colors)
                                   ),
                         alt.value("grey")
                         ),
@@ -490,35 +1842,7 @@ op_ll_vio = alt.Chart(data=df_op).transform_density(
                                          labels=False)
 )
 
-ll_line = alt.Chart(df_op).mark_line().encode(
-    x=alt.X('year(drilling_start_date):T',
-            ),
-    y=alt.Y('mean(lateral_length__ft):Q',
-            title='Lateral Length (ft)'),
-    color=alt.value("#FD8D14")
-).add_params(
-    op_vio_select
-).transform_filter(
-    op_vio_select
-)
-
-ll_band = alt.Chart(df_op).mark_errorband(extent='iqr').encode(
-    x='year(drilling_start_date):T',
-    y=alt.Y('lateral_length__ft'
-            ).title(''),
-    color=alt.value("#FD8D14")
-).add_params(
-    op_vio_select
-).transform_filter(
-    op_vio_select
-)
-
-ll_time = (ll_band + ll_line
-           ).transform_filter(
-    'year(datum.drilling_start_date) >= 2009'
-).properties(
-    width=275,
-)
+ll_time = operator_trend('lateral_length__ft', 'Lateral Length (ft)')
 
 op_ff_vio = alt.Chart(data=df_op).transform_density(
     'norm_fracture_fluid',
@@ -549,13 +1873,7 @@ op_ff_vio = alt.Chart(data=df_op).transform_density(
                         alt.Color('operator_name:N',
                                   scale=alt.Scale(
                                       domain=top_operators_list,
-                                      range=[
-                                          "#83c9ff",
-                                          "#0068c9",
-                                          "#ffabab",
-                                          "#ff2b2b",
-                                          "#7defa1",
-                                      ])
+                                      range=operator_colors)
                                   ),
                         alt.value("grey")
                         ),
@@ -572,35 +1890,7 @@ op_ff_vio = alt.Chart(data=df_op).transform_density(
     width=75,
 )
 
-ff_line = alt.Chart(df_op).mark_line().encode(
-    x=alt.X('year(drilling_start_date):T',
-            ),
-    y=alt.Y('mean(norm_fracture_fluid):Q',
-            title='Frac Fluid (gl/ft)'),
-    color=alt.value("#FD8D14")
-).add_params(
-    op_vio_select
-).transform_filter(
-    op_vio_select
-)
-
-ff_band = alt.Chart(df_op).mark_errorband(extent='iqr').encode(
-    x='year(drilling_start_date):T',
-    y=alt.Y('norm_fracture_fluid'
-            ).title(''),
-    color=alt.value("#FD8D14")
-).add_params(
-    op_vio_select
-).transform_filter(
-    op_vio_select
-)
-
-ff_time = (ff_band + ff_line
-           ).transform_filter(
-    'year(datum.drilling_start_date) >= 2009'
-).properties(
-    width=275,
-)
+ff_time = operator_trend('norm_fracture_fluid', 'Frac Fluid (gl/ft)')
 
 op_pw_vio = alt.Chart(data=df_op).transform_density(
     'norm_proppant',
@@ -631,13 +1921,7 @@ op_pw_vio = alt.Chart(data=df_op).transform_density(
                         alt.Color('operator_name:N',
                                   scale=alt.Scale(
                                       domain=top_operators_list,
-                                      range=[
-                                          "#83c9ff",
-                                          "#0068c9",
-                                          "#ffabab",
-                                          "#ff2b2b",
-                                          "#7defa1",
-                                      ])
+                                      range=operator_colors)
                                   ),
                         alt.value("grey")
                         ),
@@ -768,42 +2052,12 @@ op_ff_vio = (op_ff_vio | ff_time
     symbolStrokeWidth=4
 ).properties(title=op_ff_title)
 
-pw_line = alt.Chart(df_op).mark_line().encode(
-    x=alt.X('year(drilling_start_date):T',
-            ),
-    y=alt.Y('mean(norm_proppant):Q',
-            title='Proppant wt. (lb/ft)'),
-    color=alt.value("#FD8D14")
-).add_params(
-    op_vio_select
-).transform_filter(
-    op_vio_select
-)
-
-pw_band = alt.Chart(df_op
-                    ).mark_errorband(extent='iqr'
-                                     ).encode(
-    x='year(drilling_start_date):T',
-    y=alt.Y('norm_proppant'
-            ).title(''),
-    color=alt.value("#FD8D14")
-).add_params(
-    op_vio_select
-).transform_filter(
-    op_vio_select
-)
-
 op_pw_title = alt.TitleParams("Proppant Weight Concentration by Operator",
                               anchor="middle",
                               fontSize=20,
                               )
 
-pw_time = (pw_band + pw_line
-           ).transform_filter(
-    'year(datum.drilling_start_date) >= 2009'
-).properties(
-    width=275,
-)
+pw_time = operator_trend('norm_proppant', 'Proppant wt. (lb/ft)')
 
 op_pw_vio = (op_pw_vio | pw_time
              ).configure(
@@ -884,14 +2138,20 @@ pvt_title = alt.TitleParams("Eagle Ford Map of Hydrocarbon Fluid Type",
                             fontSize=20,
                             )
 
-pvt = alt.Chart(df,
+cube = build_data_cube(df, dataset_version, filters) if build_charts else pd.DataFrame()
+
+pvt = alt.Chart(cube,
                 title=pvt_title
-                ).mark_circle(
-    size=10,
+                ).transform_filter(
+    alt.datum.measure == 'eur_total__mbe'
+).mark_circle(
     color='steelblue'
 ).encode(
-    longitude='tophole_longitude__deg:Q',
-    latitude='tophole_latitude__deg:Q',
+    longitude='cell_lon:Q',
+    latitude='cell_lat:Q',
+    size=alt.Size('sum(wells):Q',
+                  scale=alt.Scale(range=[10, 150]),
+                  legend=None),
     color=alt.condition(map_select,
                         alt.Color('Fluid_type:N',
                                   scale=alt.Scale(
@@ -899,9 +2159,10 @@ pvt = alt.Chart(df,
                                       range=fluid_type[1])),
                         alt.value('darkgrey')
                         ),
-    tooltip=['tvd__ft',
-             'tophole_longitude__deg',
-             'tophole_latitude__deg']
+    tooltip=['Fluid_type',
+             alt.Tooltip('sum(wells):Q', title='Wells'),
+             'cell_lon',
+             'cell_lat']
 ).properties(
     width=map3_width,
     height=map3_height
@@ -909,12 +2170,36 @@ pvt = alt.Chart(df,
 ).transform_filter(pie_select
 ).interactive()
 
-pvt_map = pvt_background + pvt
+# fluid type outlines under the gridded wells
+pvt_outlines = alt.Chart(alt.Data(values=outlines['Fluid_type'])).mark_geoshape(
+    fillOpacity=0.15,
+    strokeWidth=1.5
+).encode(
+    shape='geo:G',
+    color=alt.Color('Fluid_type:N',
+                    scale=alt.Scale(
+                        domain=fluid_type[0],
+                        range=fluid_type[1])),
+    stroke=alt.Stroke('Fluid_type:N',
+                      scale=alt.Scale(
+                          domain=fluid_type[0],
+                          range=fluid_type[1]),
+                      legend=None),
+    tooltip=['Fluid_type:N',
+             alt.Tooltip('wells:Q', title='Wells')]
+).properties(
+    width=map3_width,
+    height=map3_height
+)
 
-pie_chart = alt.Chart(df, ).transform_joinaggregate(
-    Total='count()',
+pvt_map = pvt_background + pvt_outlines + pvt
+
+pie_chart = alt.Chart(cube, ).transform_filter(
+    alt.datum.measure == 'eur_total__mbe'
+).transform_joinaggregate(
+    Total='sum(wells)',
 ).encode(
-    theta=alt.Theta("count():Q").stack(True),
+    theta=alt.Theta("sum(wells):Q").stack(True),
     color=alt.condition(pie_select,
                         alt.Color("Fluid_type:N"),
                         alt.value("darkgrey"))
@@ -926,58 +2211,174 @@ pie_chart = alt.Chart(df, ).transform_joinaggregate(
 
 pie_text = pie_chart.mark_text(radius=115,
                                fill="darkblue"
-).encode(alt.Text('count():Q')
+).encode(alt.Text('sum(wells):Q')
 )
 
 pie = (pie_chart + pie_text).transform_filter(map_select)
 
 dist_width = 300
 
-eur_mbe_dist = alt.Chart(df
-                         ).mark_bar(
-    binSpacing=0,
-    color='orange'
+eur_hist = eur_histograms(df, dataset_version, filters) if build_charts else pd.DataFrame()
+
+# the small per-fluid histograms are drawn until the map is brushed, then the
+# cube takes over so the bars follow the brushed grid cells
+map_brushed = "length(data('map_select_store')) > 0"
+
+
+def eur_dist_chart(column, color, title):
+    lo, hi = eur_domains[column]
+    encoding = dict(
+        x=alt.X('bin_start:Q',
+                scale=alt.Scale(domain=[lo, hi],
+                                clamp=True),
+                title=title,
+                ).bin('binned'),
+        x2='bin_end:Q',
+        y=alt.Y('sum(wells):Q',
+                title='Count of Records').stack(None),
+    )
+
+    unbrushed = alt.Chart(eur_hist
+                          ).transform_filter(
+        alt.datum.measure == column
+    ).transform_filter(
+        f"!({map_brushed})"
+    ).transform_filter(
+        pie_select
+    ).mark_bar(
+        binSpacing=0,
+        color=color
+    ).encode(**encoding)
+
+    brushed = alt.Chart(cube
+                        ).transform_filter(
+        alt.datum.measure == column
+    ).transform_filter(
+        'isValid(datum.bin_start)'
+    ).transform_filter(
+        map_brushed
+    ).transform_filter(
+        pie_select
+    ).transform_filter(
+        map_select
+    ).mark_bar(
+        binSpacing=0,
+        color=color
+    ).encode(**encoding)
+
+    return (unbrushed + brushed).properties(width=dist_width)
+
+
+eur_mbe_dist = eur_dist_chart('eur_total__mbe', 'orange', 'Total EUR (MBE)')
+eur_oil_dist = eur_dist_chart('eur_oil__mbl', 'lightgreen', 'Oil EUR (MBL)')
+eur_gas_dist = eur_dist_chart('eur_gas__bf3', 'darkred', 'Gas EUR (BSCF)')
+
+eur_dist = eur_gas_dist | eur_oil_dist | eur_mbe_dist
+
+spacing = df[['tophole_longitude__deg', 'tophole_latitude__deg', 'eur_total__mbe']].join(
+    well_spacing(wells, group_versions['spacing']) if build_charts
+    else pd.DataFrame(columns=['parent_distance_mi', 'offsets_within'], dtype=float))
+spacing['spacing_bin'] = (spacing['parent_distance_mi'] // spacing_bin_miles) * spacing_bin_miles
+
+spacing_title = alt.TitleParams("Eagle Ford Map of Parent Well Distance",
+                                anchor="middle",
+                                fontSize=20,
+                                )
+
+spacing_points = alt.Chart(spacing[['tophole_longitude__deg', 'tophole_latitude__deg',
+                                    'parent_distance_mi', 'offsets_within']],
+                           title=spacing_title
+                           ).mark_circle(
+    size=10
 ).encode(
-    x=alt.X('eur_total__mbe:Q',
-            scale=alt.Scale(domain=[0, 3],
-                            clamp=True),
-            title='Total EUR (MBE)',
-            ).bin(maxbins=100),
-    y=alt.Y('count()').stack(None),
-).properties(width=dist_width
-).transform_filter(pie_select
-).transform_filter(map_select)
+    longitude='tophole_longitude__deg:Q',
+    latitude='tophole_latitude__deg:Q',
+    color=alt.condition('isValid(datum.parent_distance_mi)',
+                        alt.Color('parent_distance_mi:Q',
+                                  title='Parent distance (mi)',
+                                  scale=alt.Scale(scheme='viridis',
+                                                  domain=[0, 2],
+                                                  clamp=True)),
+                        alt.value('darkgrey')),
+    tooltip=[alt.Tooltip('parent_distance_mi', title='Parent distance (mi)', format='.2f'),
+             alt.Tooltip('offsets_within', title=f'Offsets within {spacing_radius_miles} mi')]
+).properties(
+    width=map3_width,
+    height=map3_height
+)
+
+spacing_eur_title = alt.TitleParams("EUR vs. Distance to Parent Well",
+                                    anchor="middle",
+                                    fontSize=20,
+                                    )
 
-eur_oil_dist = alt.Chart(df
-                         ).mark_bar(
-    binSpacing=0,
-    color="lightgreen"
+spacing_eur = alt.Chart(
+    spacing.groupby('spacing_bin')['eur_total__mbe'].agg(['median', 'count']).reset_index(),
+    title=spacing_eur_title
+).mark_line(
+    point=True,
+    color='orange'
 ).encode(
-    alt.X('eur_oil__mbl:Q',
-          scale=alt.Scale(domain=[0, 1.5], clamp=True),
-          title='Oil EUR (MBL)',
-          ).bin(maxbins=100),
-    alt.Y('count()').stack(None),
-).properties(width=dist_width
-).transform_filter(pie_select
-).transform_filter(map_select)
+    x=alt.X('spacing_bin:Q',
+            title='Distance to parent well (mi)',
+            scale=alt.Scale(domain=[0, parent_reach_miles])),
+    y=alt.Y('median:Q',
+            title='Median Total EUR (MBE)'),
+    size=alt.Size('count:Q',
+                  title='Wells'),
+    tooltip=[alt.Tooltip('spacing_bin', title='Distance from (mi)'),
+             alt.Tooltip('median', format='.2f'),
+             alt.Tooltip('count', title='Wells')]
+).properties(
+    width=r_width,
+    height=r_height
+)
 
-eur_gas_dist = alt.Chart(df
-                         ).mark_bar(
-    binSpacing=0,
-    color='darkred'
+spacing_viz = (pvt_background + spacing_points | spacing_eur).configure(
+    background='#262730'
+)
+
+forecast = decline_forecast(df, decline_parameters(dataset), dataset_version, filters) if build_charts else pd.DataFrame()
+
+forecast_title = alt.TitleParams("Forecast Cumulative Production per Well (Arps Decline)",
+                                 anchor="middle",
+                                 fontSize=20,
+                                 )
+
+forecast_band = alt.Chart(forecast).mark_area(
+    opacity=0.2
 ).encode(
-    alt.X('eur_gas__bf3:Q',
-          scale=alt.Scale(domain=[0, 5],
-                          clamp=True),
-          title='Gas EUR (BSCF)',
-          ).bin(maxbins=100),
-    alt.Y('count()').stack(None),
-).properties(width=dist_width
-).transform_filter(pie_select
-).transform_filter(map_select)
+    x=alt.X('years:Q',
+            title='Years on production'),
+    y=alt.Y('q25:Q',
+            title='Cumulative production (MBOE)'),
+    y2='q75:Q',
+    color=alt.Color('Fluid_type:N',
+                    scale=alt.Scale(
+                        domain=fluid_type[0],
+                        range=fluid_type[1]))
+)
 
-eur_dist = eur_gas_dist | eur_oil_dist | eur_mbe_dist
+forecast_line = alt.Chart(forecast).mark_line().encode(
+    x='years:Q',
+    y='q50:Q',
+    color=alt.Color('Fluid_type:N',
+                    scale=alt.Scale(
+                        domain=fluid_type[0],
+                        range=fluid_type[1])),
+    tooltip=['Fluid_type',
+             alt.Tooltip('years', format='.1f'),
+             alt.Tooltip('q50', title='Median (MBOE)', format=',.0f'),
+             'wells']
+)
+
+forecast_viz = (forecast_band + forecast_line).properties(
+    width=map3_width + r_width,
+    height=r_height,
+    title=forecast_title
+).configure(
+    background='#262730'
+)
 
 pvt_map = ((pvt_map | pie) & eur_dist).configure(
     background='#262730',
@@ -1031,12 +2432,36 @@ pvt_map = ((pvt_map | pie) & eur_dist).configure(
 )
 
 
+# the independent figures of the tabs, compiled together before the tabs draw
+tab_charts = {'overview_viz': overview_viz,
+              'tvd_map': tvd_map,
+              'op_ll_vio': op_ll_vio,
+              'op_ff_vio': op_ff_vio,
+              'op_pw_vio': op_pw_vio,
+              'pvt_map': pvt_map,
+              'spacing_viz': spacing_viz,
+              'forecast_viz': forecast_viz}
+if build_charts:
+    tab_specs = compile_charts(tab_charts)
+    st.session_state['tab_specs_key'], st.session_state['tab_specs'] = tab_specs_key, tab_specs
+
+
+def show_chart(name):
+    """Draw a tab chart from its preset snapshot or its compiled spec."""
+    # a copy, as drawing pops the datasets out of the spec
+    st.vega_lite_chart(spec=dict(tab_specs[name]),
+                       theme="streamlit",
+                       use_container_width=True)
+
+
 # -------------------
 def round_costume(val, closest=10):
     val = round(val / closest, 0) * closest
     return int(val)
 
 
+kpis = kpi_summary(df, dataset_version, filters)
+
 listTabs = ["Eagle Ford Overview",
             "Completion Analysis",
             "Production Analysis"]
@@ -1050,13 +2475,13 @@ with overview_tab:
 
     _, col1, col2, col3, _ = st.columns((1, 1, 1, 1, 1))
     col1.metric(label="Wells Drilled",
-                value=len(df.index))
+                value=kpis['wells'])
 
     col2.metric(label="Average Well Cost",
-                value=f"${round(df['total_cost__ud'].mean() / 10 ** 6, 1)} MM")
+                value=f"${round(kpis['total_cost__ud'] / 10 ** 6, 1)} MM")
 
     col3.metric(label="Average Well IP90 Cum.",
-                value=f"{round(df['cum90_total__be'].mean() / 10 ** 3, 1)}K BOE")
+                value=f"{round(kpis['cum90_total__be'] / 10 ** 3, 1)}K BOE")
     _, row2_1, _ = st.columns((0.1, 3.2, 0.1))
 
     with row2_1:
@@ -1065,60 +2490,234 @@ with overview_tab:
                     "along with the drilling activities over time and the well count per sub-play. Try to select"
                     "one of the charts based on what you want to focus on"
                     "")
-        st.altair_chart(overview_viz,
-                        theme="streamlit",
-                        use_container_width=True)
+        show_chart('overview_viz')
+
+        with st.expander("**Drilling time-lapse**"):
+            timelapse_play = False
+            if not len(timelapse_quarters):
+                st.warning("No dated wells in the current filters")
+            else:
+                quarter_labels = [f"{pd.Timestamp(q).year} Q{pd.Timestamp(q).quarter}" for q in timelapse_quarters]
+                timelapse_to = st.select_slider('**Show the wells drilled up to:**',
+                                                quarter_labels,
+                                                quarter_labels[-1])
+                timelapse_play = st.button('Play from the first quarter')
+                timelapse_caption = st.empty()
+
+                # row bounds of each quarter's frame
+                frame_bounds = np.append(np.searchsorted(timelapse['quarter'].to_numpy(), timelapse_quarters),
+                                         len(timelapse))
+                shown = 0 if timelapse_play else quarter_labels.index(timelapse_to) + 1
+                with chart_lock:
+                    timelapse_spec = timelapse_viz.to_dict()
+                timelapse_spec['datasets'] = {'timelapse': timelapse.iloc[:frame_bounds[shown]]}
+                timelapse_chart = st.vega_lite_chart(spec=timelapse_spec,
+                                                     theme="streamlit",
+                                                     use_container_width=True)
+                timelapse_caption.markdown(f"Wells drilled up to **{quarter_labels[shown - 1]}**"
+                                           if shown else "")
+
+        with st.expander("**Find a well**"):
+            well_query = st.text_input('**API number, or the start of a well or operator name:**')
+            found = search_wells(dataset, wells, dataset_version, well_query)
+            if well_query.strip() and not len(found):
+                st.warning(f"No well matches {well_query.strip()}")
+            elif len(found):
+                well_position = st.selectbox(
+                    f'**Matching wells ({len(found)}{"+" if len(found) == search_limit else ""}):**',
+                    found,
+                    format_func=lambda p: f"{wells['Name'].iat[p]} - {wells['operator_name'].iat[p]} "
+                                          f"(API {wells['api_number'].iat[p]})"
+                )
+                well = wells.iloc[well_position]
+                st.markdown(f"**{well['Name']}**, {well['operator_name']}, {well['sub_play_name']} - "
+                            f"API {well['api_number']}")
+                detail_columns = st.columns(len(well_details) + 1)
+                for column, (section, attributes) in zip(detail_columns, well_details.items()):
+                    column.markdown(f"**{section}**")
+                    column.dataframe(pd.DataFrame({'attribute': attributes.values(),
+                                                   'value': [str(well[c]) for c in attributes]}),
+                                     hide_index=True,
+                                     use_container_width=True)
+                decline = decline_parameters(dataset).loc[well.name]
+                detail_columns[-1].markdown("**Decline fit**")
+                detail_columns[-1].dataframe(pd.DataFrame({
+                    'attribute': ['qi (BOE/day)', 'Di (1/yr)', 'b', 'Fit error (log RMS)'],
+                    'value': [f"{decline['qi']:,.1f}", f"{decline['di'] * 365:.2f}",
+                              f"{decline['b']:.2f}", f"{decline['fit_error']:.3f}"]}),
+                    hide_index=True,
+                    use_container_width=True)
+
+        with st.expander("**Find offset wells**"):
+            offset_query = st.text_input(
+                '**API number of a well, or a "latitude, longitude" point:**'
+            )
+            offset_radius = st.slider('**Search radius (miles)**', 0.25, 10.0, 1.0, 0.25)
+            offset_k = st.number_input('**Nearest wells to list**', 1, 100, 10)
+
+            offset_point = None
+            offset_self = []
+            if ',' in offset_query:
+                try:
+                    lat, lon = (float(v) for v in offset_query.split(','))
+                    offset_point = (lon, lat)
+                except ValueError:
+                    st.warning("Enter the point as latitude, longitude in degrees")
+                if offset_point is not None and not np.isfinite(offset_point).all():
+                    st.warning("Enter the point as latitude, longitude in degrees")
+                    offset_point = None
+            elif offset_query.strip():
+                match = api_position(dataset, wells, offset_query.strip())
+                if match is not None:
+                    offset_self = [match]
+                    offset_point = (wells['tophole_longitude__deg'].iloc[match],
+                                    wells['tophole_latitude__deg'].iloc[match])
+                    if not np.isfinite(offset_point).all():
+                        st.warning(f"Well {offset_query.strip()} has no location")
+                        offset_point = None
+                else:
+                    st.warning(f"No well with API number {offset_query.strip()}")
+
+            if offset_point is not None:
+                offset_columns = ['api_number', 'Name', 'operator_name', 'sub_play_name',
+                                  'drilling_start_date', 'tvd__ft', 'lateral_length__ft']
+                for label, (positions, distance), limit in [
+                        (f"Wells within {offset_radius} miles",
+                         wells_within(wells, group_versions['location'], *offset_point, offset_radius),
+                         None),
+                        ("Nearest wells",
+                         nearest_wells(wells, group_versions['location'], *offset_point, offset_k + len(offset_self)),
+                         offset_k)]:
+                    keep = ~np.isin(positions, offset_self)
+                    offsets = wells.iloc[positions[keep]][offset_columns].assign(
+                        distance_mi=distance[keep].round(2)).head(limit)
+                    st.markdown(f"{label}: {len(offsets)}")
+                    st.dataframe(offsets,
+                                 hide_index=True,
+                                 use_container_width=True)
 
 with Comp_tab:
     st.header("Analyzing Well Completion data")
     st.markdown("Important completion metrics based on your filtering:")
     _, col1, col2, col3, _ = st.columns((1, 1, 1, 1, 1))
+    tile_sketches = completion_sketches(wells, df, dataset_version, filters)
+    median_help = "Median: {:,.0f} {} (within {:.0%})"
 
     col1.metric(label="Average Lateral Length",
-                value=f"{round_costume(df['lateral_length__ft'].mean())} ft")
+                value=f"{round_costume(kpis['lateral_length__ft'])} ft",
+                help=median_help.format(sketch_median(tile_sketches, 'lateral_length__ft'),
+                                        'ft', sketch_alpha))
 
     col2.metric(label="Average Frac Fluid Vol.",
-                value=f"{round_costume(df['norm_fracture_fluid'].mean())} gal/ft")
+                value=f"{round_costume(kpis['norm_fracture_fluid'])} gal/ft",
+                help=median_help.format(sketch_median(tile_sketches, 'norm_fracture_fluid'),
+                                        'gal/ft', sketch_alpha))
 
     col3.metric(label="Average Proppant Wt.",
-                value=f"{round_costume(df['norm_proppant'].mean())} lb/ft")
+                value=f"{round_costume(kpis['norm_proppant'])} lb/ft",
+                help=median_help.format(sketch_median(tile_sketches, 'norm_proppant'),
+                                        'lb/ft', sketch_alpha))
     _, row2_1, _ = st.columns((0.1, 3.2, 0.1))
     with row2_1:
         st.markdown("The below visualizations showcases comparisons on lateral length, frac fluid, and proppant "
-                    "weight for the top five operators with the highest well count")
-
-        st.altair_chart(tvd_map,
-                        theme="streamlit",
-                        use_container_width=True
-                        )
-
-        st.altair_chart(op_ll_vio,
-                        theme="streamlit",
-                        use_container_width=True
-                        )
+                    "weight for the operators selected in the filters, by default the five with the highest well "
+                    "count")
+
+        show_chart('tvd_map')
+
+        show_chart('op_ll_vio')
+
+        show_chart('op_ff_vio')
+
+        show_chart('op_pw_vio')
+
+        st.markdown("Completion design vs. EUR: a linear fit of total EUR on proppant, frac fluid and lateral "
+                    "length for each group, shown as the EUR predicted while one design variable moves and the "
+                    "others stay at the group average")
+        coefficients, dependence = completion_regressions(df, dataset_version, filters)
+        regression_grouping = st.radio('**Fit per:**', ['Operator', 'Sub-play'], horizontal=True)
+
+        regression_groups = coefficients[coefficients['grouping'] == regression_grouping]
+        if regression_grouping == 'Operator':
+            regression_groups = regression_groups[regression_groups['group'].isin(top_operators_list)]
+        regression_curves = dependence[(dependence['grouping'] == regression_grouping)
+                                       & dependence['group'].isin(regression_groups['group'])]
+
+        regression_chart = alt.Chart(regression_curves).mark_line().encode(
+            x=alt.X('value:Q',
+                    title=None),
+            y=alt.Y('eur_total__mbe:Q',
+                    title='Predicted Total EUR (MBE)'),
+            color=alt.Color('group:N',
+                            title=regression_grouping,
+                            scale=alt.Scale(range=color_cat)),
+            tooltip=['group',
+                     alt.Tooltip('value', format=',.0f'),
+                     alt.Tooltip('eur_total__mbe', title='EUR (MBE)', format='.2f')]
+        ).properties(
+            width=250,
+            height=r_height
+        ).facet(
+            column=alt.Column('feature:N',
+                              title=None)
+        ).resolve_scale(
+            x='independent'
+        ).configure(
+            background='#262730'
+        )
 
-        st.altair_chart(op_ff_vio,
-                        theme="streamlit",
-                        use_container_width=True
-                        )
+        with chart_lock:
+            st.altair_chart(regression_chart,
+                            theme="streamlit",
+                            use_container_width=True)
 
-        st.altair_chart(op_pw_vio,
-                        theme="streamlit",
-                        use_container_width=True)
+        st.dataframe(regression_groups.drop(columns='grouping').rename(
+            columns={'group': regression_grouping, 'r2': 'R²', **regression_features}),
+            hide_index=True,
+            use_container_width=True)
 
 with prod_tab:
     st.header("Analyzing Well Production Data")
+
+    with st.expander("**Price deck and economics**"):
+        _, col1, col2, col3, col4, _ = st.columns((0.1, 1, 1, 1, 1, 0.1))
+        oil_price = col1.number_input('**Base oil price ($/bbl)**', 0, 300, 80, 5)
+        oil_deck = col2.text_input('**Oil price scenarios ($/bbl)**', '40, 50, 60, 70, 80, 90, 100, 120')
+        gas_price = col3.number_input('**Gas price ($/mcf)**', 0.0, 20.0, 3.0, 0.25)
+        discount_rate = col4.slider('**Discount rate**', 0.0, 0.3, 0.1, 0.01)
+
+        try:
+            oil_prices = sorted({float(p) for p in oil_deck.split(',') if p.strip()} | {float(oil_price)})
+        except ValueError:
+            st.warning("Enter the oil price scenarios as comma separated numbers")
+            oil_prices = [float(oil_price)]
+
+    factors = discount_factors(df, decline_parameters(dataset),
+                               dataset_version, filters, discount_rate)
+    revenue, npv, breakeven = well_economics(df, factors, oil_prices, gas_price)
+    base = oil_prices.index(float(oil_price))
+
     st.markdown("Important production metrics based on your filtering:")
 
     _, col1, col2, col3, _ = st.columns((1, 1, 1, 1, 1))
     col1.metric(label="Average EUR",
-                value=f"{round(df['eur_total__mbe'].mean(), 2)} MMBOE")
+                value=f"{round(kpis['eur_total__mbe'], 2)} MMBOE")
 
     col2.metric(label="Average Gas Oil Ratio",
-                value=f"{round_costume(df['GOR'].mean())} SCF/BL")
+                value=f"{round_costume(kpis['GOR'])} SCF/BL")
+
+    col3.metric(label=f"Average Revenue (${oil_price} Oil Price)",
+                value=f"${round(np.nanmean(revenue[:, base]) / 10 ** 6, 1)} MM")
+
+    _, col1, col2, col3, _ = st.columns((1, 1, 1, 1, 1))
+    col1.metric(label=f"Average NPV{round(discount_rate * 100)}",
+                value=f"${round(np.nanmean(npv[:, base]) / 10 ** 6, 1)} MM")
 
-    col3.metric(label="Average Revenue ($80 Oil Price)",
-                value=f"${round_costume(df['eur_total__mbe'].mean() * 80)} MM")
+    col2.metric(label="Median Breakeven Oil Price",
+                value=f"${round(np.nanmedian(breakeven), 1)}/bbl")
+
+    col3.metric(label="Wells with Positive NPV",
+                value=f"{round(np.nanmean(np.where(np.isnan(npv[:, base]), np.nan, npv[:, base] > 0)) * 100)}%")
 
     _, row2_1, _ = st.columns((0.1, 3.2, 0.1))
 
@@ -1131,6 +2730,109 @@ with prod_tab:
                     "and total prodcution in millions in barrels of oil equivalent (MBE). Try selecting"
                     "one of the charts based on what you want to focus on"
                     "")
-        st.altair_chart(pvt_map,
-                        theme="streamlit",
-                        use_container_width=True)
+        show_chart('pvt_map')
+
+        portfolio = pd.DataFrame({'oil_price': oil_prices,
+                                  'npv': np.nansum(npv, axis=0) / 10 ** 6,
+                                  'economic': np.nanmean(np.where(np.isnan(npv), np.nan, npv > 0), axis=0)})
+
+        portfolio_title = alt.TitleParams(f"Portfolio NPV{round(discount_rate * 100)} by Oil Price "
+                                          f"({len(df.index)} wells, ${gas_price}/mcf gas)",
+                                          anchor="middle",
+                                          fontSize=20,
+                                          )
+
+        portfolio_chart = alt.Chart(portfolio,
+                                    title=portfolio_title
+                                    ).mark_line(
+            point=True,
+            color='#29b09d'
+        ).encode(
+            x=alt.X('oil_price:Q',
+                    title='Oil price ($/bbl)'),
+            y=alt.Y('npv:Q',
+                    title='Portfolio NPV ($MM)'),
+            tooltip=[alt.Tooltip('oil_price', title='Oil price ($/bbl)'),
+                     alt.Tooltip('npv', title='NPV ($MM)', format=',.0f'),
+                     alt.Tooltip('economic', title='Wells with positive NPV', format='.0%')]
+        ).properties(
+            width=map3_width + r_width,
+            height=r_height
+        ).configure(
+            background='#262730'
+        )
+
+        with chart_lock:
+            st.altair_chart(portfolio_chart,
+                            theme="streamlit",
+                            use_container_width=True)
+
+        st.markdown(""
+                    "Parent-child spacing: each well is colored by the distance to the nearest well drilled "
+                    f"before it (grey when none is within {parent_reach_miles:g} miles), and the median EUR "
+                    "is compared across parent distances"
+                    "")
+        show_chart('spacing_viz')
+
+        st.markdown(""
+                    "Production forecast: a hyperbolic Arps decline is fitted to every well's 30 and 90 day "
+                    "cumulative production and its EUR. The lines show the median forecast well per fluid type "
+                    "and the bands the 25th to 75th percentiles"
+                    "")
+        show_chart('forecast_viz')
+
+        st.markdown(""
+                    "Type curves: the P10, P50 and P90 forecast cumulative production per lateral foot for one "
+                    "sub-play and fluid type under the current filters"
+                    "")
+        curves = type_curves(df, decline_parameters(dataset), dataset_version, filters)
+        _, col1, col2, _ = st.columns((0.5, 1, 1, 0.5))
+        curve_sub_play = col1.selectbox('**Sub-play**',
+                                        sorted(curves['sub_play_name'].unique()))
+        curve_fluid = col2.selectbox('**Fluid type**',
+                                     sorted(curves.loc[curves['sub_play_name'] == curve_sub_play,
+                                                       'Fluid_type'].unique()))
+        curve = curves[(curves['sub_play_name'] == curve_sub_play)
+                       & (curves['Fluid_type'] == curve_fluid)]
+
+        type_curve_title = alt.TitleParams(f"{curve_sub_play} {curve_fluid} Type Curves "
+                                           f"({curve['wells'].max() if len(curve) else 0} wells)",
+                                           anchor="middle",
+                                           fontSize=20,
+                                           )
+
+        type_curve_chart = alt.Chart(curve,
+                                     title=type_curve_title
+                                     ).mark_line().encode(
+            x=alt.X('years:Q',
+                    title='Years on production'),
+            y=alt.Y('boe_per_ft:Q',
+                    title='Cumulative production (BOE/ft)'),
+            color=alt.Color('case:N',
+                            title=None,
+                            scale=alt.Scale(domain=list(type_curve_percentiles),
+                                            range=["#ff8700", "#ffd16a", "#83c9ff"])),
+            tooltip=['case',
+                     alt.Tooltip('years', format='.1f'),
+                     alt.Tooltip('boe_per_ft', title='BOE/ft', format=',.1f')]
+        ).properties(
+            width=map3_width + r_width,
+            height=r_height
+        ).configure(
+            background='#262730'
+        )
+
+        with chart_lock:
+            st.altair_chart(type_curve_chart,
+                            theme="streamlit",
+                            use_container_width=True)
+
+# the time-lapse plays once every tab has been drawn, so its frames never
+# hold back the rest of the page
+if timelapse_play:
+    for frame, label in enumerate(quarter_labels):
+        # each step sends only that quarter's new cells
+        timelapse_chart.add_rows(
+            timelapse=timelapse.iloc[frame_bounds[frame]:frame_bounds[frame + 1]])
+        timelapse_caption.markdown(f"Wells drilled up to **{label}**")
+        time.sleep(timelapse_frame_seconds)
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from parallel import process_map
+
+earth_radius_miles = 3958.8
+miles_per_degree = 69.09
+basin_latitude = 28.8  # reference latitude of the equirectangular projection
+
+# a parent further away than this is treated as no parent at all
+parent_reach_miles = 5.0
+# tables of fewer wells than this are answered in this process
+parallel_min_wells = 20000
+
+
+def project_miles(lon, lat):
+    """Equirectangular x/y in miles, accurate to a few percent across the basin."""
+    return np.column_stack([np.asarray(lon, dtype=float)
+                            * np.cos(np.radians(basin_latitude)) * miles_per_degree,
+                            np.asarray(lat, dtype=float) * miles_per_degree])
+
+
+def haversine_miles(lon1, lat1, lon2, lat2):
+    """Great-circle distance in miles, broadcasting over array arguments."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * earth_radius_miles * np.arcsin(np.sqrt(a))
+
+
+unknown_day = np.iinfo(np.int64).max
+
+# per-process state of the spacing workers, set once by _init_spacing
+_spacing = {}
+
+
+def _init_spacing(lon, lat, day, radius):
+    _spacing.update(lon=lon, lat=lat, day=day, radius=radius,
+                    tree=cKDTree(project_miles(lon, lat)))
+
+
+def _spacing_chunk(bounds):
+    """Parent distance and offset count for the wells in ``bounds`` (start, stop)."""
+    start, stop = bounds
+    lon, lat, day, tree = _spacing['lon'], _spacing['lat'], _spacing['day'], _spacing['tree']
+    points = project_miles(lon[start:stop], lat[start:stop])
+    rows = np.arange(stop - start)
+
+    offsets = tree.query_ball_point(points, r=_spacing['radius'], return_length=True) - 1
+
+    # nearest earlier-drilled well: look through the k nearest neighbours and
+    # widen k only for the wells whose k-th neighbour is still within reach
+    parent = np.full(stop - start, -1)
+    pending = rows[day[start:stop] != unknown_day]
+    k = 16
+    while len(pending):
+        k = min(k, len(lon))
+        distance, index = tree.query(points[pending], k=k, distance_upper_bound=parent_reach_miles)
+        distance, index = distance.reshape(len(pending), -1), index.reshape(len(pending), -1)
+        found = np.isfinite(distance)
+        earlier = found.copy()
+        earlier[found] = day[index[found]] < np.broadcast_to(day[start + pending][:, None], found.shape)[found]
+        hit = earlier.any(axis=1)
+        parent[pending[hit]] = index[hit, earlier[hit].argmax(axis=1)]
+        if k == len(lon):
+            break
+        pending = pending[~hit & found[:, -1]]
+        k *= 4
+
+    has_parent = parent >= 0
+    parent_distance = np.full(stop - start, np.nan)
+    parent_distance[has_parent] = haversine_miles(lon[start:stop][has_parent], lat[start:stop][has_parent],
+                                                  lon[parent[has_parent]], lat[parent[has_parent]])
+    return parent_distance, offsets
+
+
+def spacing_table(lon, lat, day, radius, workers=None):
+    """Nearest earlier-drilled neighbour distance and offset count per well.
+
+    ``day`` is the drilling start as an integer day number, negative when
+    unknown; wells of unknown date get no parent and are never a parent. Each
+    well's offsets are the other wells within ``radius`` miles. Large tables
+    are split into chunks answered by a process pool, each worker querying its
+    own copy of the KD-tree.
+    """
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    # unknown dates sort after every known one, so they are never anyone's parent
+    day = np.where(np.asarray(day) < 0, unknown_day, day).astype(np.int64)
+    workers = workers or os.cpu_count() or 1
+
+    if len(lon) == 0:
+        return np.array([]), np.array([], dtype=int)
+    edges = np.linspace(0, len(lon), workers * 4 + 1).astype(int)
+    results = process_map(_spacing_chunk, list(zip(edges[:-1], edges[1:])), len(lon), parallel_min_wells,
+                          workers, initializer=_init_spacing, initargs=(lon, lat, day, radius))
+
+    return (np.concatenate([r[0] for r in results]),
+            np.concatenate([r[1] for r in results]))